@@ -0,0 +1,108 @@
+import hashlib
+import re
+from collections import Counter
+
+from bs4 import BeautifulSoup
+
+# Elementos que nunca aportan contenido al corpus
+NOISE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe"]
+
+# Clases o ids típicos de menús, banners de cookies y pies de página. Se comparan
+# con cada clase por separado y solo como palabra completa (`site-footer` sí,
+# `with-sidebar-menus` o `footnote` no)
+NOISE_ATTR_RE = re.compile(
+    r"(?:^|[-_])(?:cookies?|consent|navbar|breadcrumbs?|menu|footer|social|share|skip-link)(?:$|[-_])", re.I
+)
+
+# Etiquetas que nunca se eliminan por sus clases: contienen (o son) el contenido
+PROTECTED_TAGS = {"html", "body", "main", "article"}
+
+# Contenedores del contenido principal, por orden de preferencia
+MAIN_SELECTORS = ["main", "article", "[role=main]", "#content", "#main-content", ".main-content"]
+
+# Bloques candidatos a repetirse en todas las páginas
+BLOCK_TAGS = ["div", "section", "ul", "ol", "table", "p"]
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _fingerprint(element):
+    return hashlib.md5(_normalize(element.get_text(" ")).encode("utf-8")).hexdigest()
+
+
+class BoilerplateRemover:
+    """
+    Elimina la plantilla común de las páginas antes de convertirlas a markdown.
+
+    Combina dos técnicas: primero descarta etiquetas y bloques de navegación
+    conocidos y se queda con el contenedor principal si existe; después quita
+    los bloques cuyo texto se repite en al menos `min_pages` páginas y en una
+    fracción `min_ratio` del crawl, aprendidos con `fit`.
+    """
+
+    def __init__(self, min_pages=5, min_ratio=0.3, min_chars=20):
+        self.min_pages = min_pages
+        self.min_ratio = min_ratio
+        self.min_chars = min_chars
+        self.block_counts = Counter()
+        self.pages_seen = 0
+
+    def _is_noise(self, element):
+        tokens = [element.get("id", "")] + element.get("class", [])
+        return any(token and NOISE_ATTR_RE.search(token) for token in tokens)
+
+    def _strip_known_noise(self, soup):
+        for element in soup.find_all(NOISE_TAGS):
+            element.decompose()
+
+        # El contenedor principal y sus antecesores se conservan aunque sus clases
+        # parezcan de navegación (p. ej. <body class="with-sidebar-menu">)
+        candidates = [soup.select_one(selector) for selector in MAIN_SELECTORS]
+        protected = set()
+        for candidate in candidates:
+            if candidate is not None:
+                protected.add(id(candidate))
+                protected.update(id(parent) for parent in candidate.parents)
+
+        for element in soup.find_all(True):
+            if getattr(element, "decomposed", False) or element.attrs is None:
+                continue
+            if element.name in PROTECTED_TAGS or id(element) in protected:
+                continue
+            if self._is_noise(element):
+                element.decompose()
+
+        for main in candidates:
+            if (main is not None and not getattr(main, "decomposed", False)
+                    and len(_normalize(main.get_text(" "))) >= self.min_chars):
+                return main
+        return soup.body or soup
+
+    def _blocks(self, root):
+        for element in root.find_all(BLOCK_TAGS):
+            if len(_normalize(element.get_text(" "))) >= self.min_chars:
+                yield element
+
+    def fit(self, html_pages):
+        """ Contar en cuántas páginas aparece cada bloque (una vez por página) """
+        for html in html_pages:
+            root = self._strip_known_noise(BeautifulSoup(html, "html.parser"))
+            self.block_counts.update({_fingerprint(block) for block in self._blocks(root)})
+            self.pages_seen += 1
+        return self
+
+    def is_boilerplate(self, fingerprint):
+        count = self.block_counts.get(fingerprint, 0)
+        return count >= self.min_pages and count >= self.min_ratio * self.pages_seen
+
+    def clean(self, html):
+        """ Devolver el HTML de la página sin la plantilla común """
+        root = self._strip_known_noise(BeautifulSoup(html, "html.parser"))
+        for block in list(self._blocks(root)):
+            if getattr(block, "decomposed", False):
+                continue
+            if self.is_boilerplate(_fingerprint(block)):
+                block.decompose()
+        return str(root)
@@ -1,26 +1,37 @@
 import os
-import markdown
 import requests
 import json
-from bs4 import BeautifulSoup
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 import chromadb
+from embedding_backends import load_backend
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import QueryEmbeddingCache
+from index_versions import create_version, garbage_collect, publish, resolve
+from markdown_chunker import chunk_markdown, chunk_metadata
+from query_expansion import QueryExpander
+from reranker import CrossEncoderReranker
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Agrupación de consultas concurrentes: tamaño máximo del lote y espera máxima (ms)
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+# Caché de embeddings de preguntas repetidas: número máximo de entradas y caducidad (s)
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+
+# Re-ranking opcional con cross-encoder y presupuesto de tokens para el contexto
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() == "true"
+RERANKER_TOKEN_BUDGET = int(os.getenv("RERANKER_TOKEN_BUDGET", "1200"))
+
+# Diccionario semántico generado por markdown_analyzer.py para expandir las preguntas
+DICTIONARY_PREFIX = os.getenv("DICTIONARY_PREFIX", "resultados")
 
 # ==============================
-# 1️⃣ Extraer texto de archivos Markdown
+# 1️⃣ Leer archivos Markdown
 # ==============================
-def extract_text_from_markdown(md_file):
-    """ Leer archivo Markdown y convertirlo en texto plano """
-    with open(md_file, "r", encoding="utf-8") as f:
-        md_content = f.read()
-    
-    html_content = markdown.markdown(md_content)
-    soup = BeautifulSoup(html_content, "html.parser")
-    return soup.get_text()
-
 def load_markdown_files(folder):
-    """ Leer recursivamente todos los archivos Markdown """
+    """ Leer recursivamente todos los archivos Markdown (sin convertir, para conservar su estructura) """
     all_texts = []
     file_sources = []  # Lista para guardar las fuentes de origen
     
@@ -29,8 +40,8 @@ def load_markdown_files(folder):
             if filename.endswith(".md"):
                 file_path = os.path.join(root, filename)
                 relative_path = os.path.relpath(file_path, folder)
-                text = extract_text_from_markdown(file_path)
-                all_texts.append(text)
+                with open(file_path, "r", encoding="utf-8") as f:
+                    all_texts.append(f.read())
                 file_sources.append(f"Archivo: {relative_path}")
     
     return all_texts, file_sources
@@ -38,61 +49,99 @@ def load_markdown_files(folder):
 # ==============================
 # 2️⃣ Dividir textos y calcular embeddings
 # ==============================
-def chunk_texts(texts, chunk_size=500, chunk_overlap=50):
-    """ Dividir texto en fragmentos pequeños """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+def chunk_texts(texts, sources=None, chunk_size=500, chunk_overlap=50):
+    """ Dividir cada texto en fragmentos por secciones, con su fuente y ruta de títulos """
     chunks = []
-    for text in texts:
-        chunks.extend(text_splitter.split_text(text))
-    return chunks
+    metadatas = []
+    for i, text in enumerate(texts):
+        source = sources[i] if sources else f"Documento {i}"
+        for chunk in chunk_markdown(text, chunk_size=chunk_size, overlap=chunk_overlap):
+            chunks.append(chunk.text)
+            metadatas.append({"source": source, **chunk_metadata(chunk)})
+    return chunks, metadatas
 
 def compute_embeddings(chunks):
-    """ Calcular embeddings """
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = model.encode(chunks, convert_to_numpy=True)
+    """ Calcular embeddings (backend PyTorch u ONNX según EMBEDDING_BACKEND) """
+    model = load_backend(model_name=EMBEDDING_MODEL_NAME)
+    embeddings = model.encode(chunks, batch_size=64)
     return embeddings, model
 
 # ==============================
 # 3️⃣ Almacenar en ChromaDB
 # ==============================
-def store_in_chromadb(chunks, embeddings, sources=None):
-    """ Almacenar texto y embeddings en ChromaDB """
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    collection = chroma_client.get_or_create_collection(name="markdown_docs")
-    
-    # Eliminar datos existentes para evitar duplicados
-    collection.delete(where={})
-    print("🧹 Datos antiguos eliminados de ChromaDB")
-    
-    # Lista para almacenar metadatos
-    metadatas = []
+def store_in_chromadb(chunks, embeddings, metadatas=None):
+    """ Almacenar texto y embeddings en una versión nueva de la colección y activarla """
+    if not chunks:
+        print("⚠️ No hay fragmentos que almacenar; la versión activa no cambia")
+        return None
+
+    # Las consultas siguen usando la versión activa hasta que la nueva está completa
+    name, _, collection = create_version("./chroma_db", "markdown_docs")
     
-    # Generar metadatos para cada chunk
+    # Generar metadatos para cada chunk (fuente, sección y posición si se conocen)
+    chunk_metadatas = []
     for i, chunk in enumerate(chunks):
-        if sources and i < len(sources):
-            metadata = {"source": sources[i], "chunk_id": str(i)}
+        if metadatas and i < len(metadatas):
+            metadata = {**metadatas[i], "chunk_id": str(i)}
         else:
             metadata = {"source": f"Fragmento Markdown {i}", "chunk_id": str(i)}
-        metadatas.append(metadata)
+        chunk_metadatas.append(metadata)
     
     # Añadir todos los chunks a ChromaDB de una vez (más eficiente)
     collection.add(
         ids=[str(i) for i in range(len(chunks))],
         embeddings=[emb.tolist() for emb in embeddings],
-        metadatas=metadatas,
+        metadatas=chunk_metadatas,
         documents=chunks
     )
     print(f"✅ {len(chunks)} fragmentos Markdown almacenados en ChromaDB")
 
+    # Cambiar el alias tras una consulta de prueba y eliminar versiones caducadas
+    publish("./chroma_db", "markdown_docs", name, query_embedding=embeddings[0])
+    garbage_collect("./chroma_db", "markdown_docs")
+    return name
+
 # ==============================
 # 4️⃣ Consultar ChromaDB
 # ==============================
-def query_chromadb(query_text, model, top_n=5):
-    """ Consultar ChromaDB para encontrar los fragmentos más relevantes """
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    collection = chroma_client.get_collection(name="markdown_docs")
-    query_embedding = model.encode([query_text])[0].tolist()
-    
+def query_chromadb(query_text, model, top_n=5, reranker=None, expander=None):
+    """ Consultar ChromaDB para encontrar los fragmentos más relevantes
+
+    `model` puede ser un SentenceTransformer o cualquier envoltorio con su misma
+    interfaz `encode`: EmbeddingBatcher agrupa las preguntas concurrentes en un
+    único lote y QueryEmbeddingCache evita recalcular las preguntas repetidas.
+
+    Con `reranker` se recupera un conjunto más amplio de candidatos (cuyo tamaño
+    se reduce automáticamente con la carga) y el cross-encoder decide qué
+    fragmentos entran en el presupuesto de tokens, en lugar del umbral fijo.
+
+    Con `expander` la pregunta se completa con las definiciones de sus
+    acrónimos y sus términos relacionados antes de calcular el embedding.
+    """
+    path, _ = resolve("./chroma_db", "markdown_docs")
+    collection = chromadb.PersistentClient(path=path).get_collection(name="markdown_docs")
+    search_text = expander.expand(query_text).text if expander is not None else query_text
+    query_embedding = model.encode([search_text])[0].tolist()
+
+    if reranker is not None:
+        with reranker.depth.acquire() as depth:
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=max(depth, top_n),
+                include=["documents", "metadatas"]
+            )
+            if not results["documents"] or len(results["documents"][0]) == 0:
+                return "No se encontró información relevante"
+            ranked = reranker.rerank(query_text, results["documents"][0], results["metadatas"][0])
+
+        context_parts = [
+            f"[Fragmento {i+1} - Fuente: {metadata.get('source', 'Desconocido')}]\n{doc}"
+            for i, (doc, metadata, _) in enumerate(ranked)
+        ]
+        if context_parts:
+            return "\n\n".join(context_parts)
+        return "No se encontró información suficientemente relevante para tu pregunta."
+
     # Aumentar el número de resultados para obtener más contexto
     results = collection.query(
         query_embeddings=[query_embedding], 
@@ -109,6 +158,8 @@ def query_chromadb(query_text, model, top_n=5):
         # Solo incluir fragmentos con una distancia razonable (menor es mejor)
         if distance < 1.5:  # Umbral ajustable según necesidad
             source = metadata.get("source", "Desconocido")
+            if metadata.get("section"):
+                source += f" ({metadata['section']})"
             context_parts.append(f"[Fragmento {i+1} - Fuente: {source}]\n{doc}")
     
     if context_parts:
@@ -122,9 +173,9 @@ def query_chromadb(query_text, model, top_n=5):
 # Configurar la URL de la API de LMStudio
 LMSTUDIO_API_URL = "http://127.0.0.1:1234/v1/chat/completions"
 
-def ask_ai_with_context(question, model):
+def ask_ai_with_context(question, model, reranker=None, expander=None):
     """ Consultar ChromaDB para obtener fragmentos Markdown y generar respuesta con el modelo local LMStudio """
-    context = query_chromadb(question, model)  
+    context = query_chromadb(question, model, reranker=reranker, expander=expander)
     
     # Prompt más estructurado para guiar mejor al modelo
     prompt = f"""Eres un asistente experto en la UPC (Universitat Politècnica de Catalunya).
@@ -185,30 +236,37 @@ def main():
     # Cargar los archivos Markdown con sus fuentes
     texts, sources = load_markdown_files(markdown_folder)
     
-    # Dividir los textos en chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = []
-    chunk_sources = []
+    # Dividir los textos en chunks por secciones, asociando a cada uno su fuente y ruta de títulos
+    chunks, metadatas = chunk_texts(texts, sources)
     
-    # Procesar cada texto y mantener registro de su origen
-    for i, text in enumerate(texts):
-        # Dividir este texto específico en chunks
-        text_chunks = text_splitter.split_text(text)
-        chunks.extend(text_chunks)
-        
-        # Asociar la fuente a cada chunk generado
-        for _ in text_chunks:
-            chunk_sources.append(sources[i])
+    # Descartar fragmentos casi idénticos (páginas en en/es/ca o repetidas bajo varias URLs)
+    from dedupe import deduplicate_chunks
+    kept, metadatas = deduplicate_chunks(chunks, metadatas)
+    chunks = [chunks[i] for i in kept]
     
     # Calcular embeddings para todos los chunks
     embeddings, model = compute_embeddings(chunks)
     
     # Almacenar chunks con sus metadatos en ChromaDB
-    store_in_chromadb(chunks, embeddings, chunk_sources)
+    store_in_chromadb(chunks, embeddings, metadatas)
     """
     
-    # Cargar el modelo para consultas
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+    # Cargar el modelo para consultas (las preguntas concurrentes se agrupan en lotes
+    # y las repetidas se sirven desde la caché)
+    backend = load_backend(model_name=EMBEDDING_MODEL_NAME)
+    model = QueryEmbeddingCache(
+        EmbeddingBatcher(
+            backend,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS
+        ),
+        # Los vectores de PyTorch y de ONNX int8 difieren ligeramente: no se mezclan en la caché
+        model_name=f"{EMBEDDING_MODEL_NAME}:{backend.name}",
+        max_entries=QUERY_CACHE_MAX_ENTRIES,
+        ttl_seconds=QUERY_CACHE_TTL_SECONDS
+    )
+    reranker = CrossEncoderReranker(token_budget=RERANKER_TOKEN_BUDGET) if RERANKER_ENABLED else None
+    expander = QueryExpander.load(DICTIONARY_PREFIX)
     
     # Bucle de preguntas interactivo
     print("✨ Asistente DeepSeek UPC listo para responder preguntas sobre la UPC ✨")
@@ -217,9 +275,12 @@ def main():
     while True:
         question = input("\n❓ Pregunta: ")
         if question.lower() == "salir":
+            stats = model.stats()
+            print(f"📊 Caché de embeddings: {stats['hits']} aciertos, {stats['misses']} fallos "
+                  f"(tasa de acierto {stats['hit_rate']:.0%})")
             break
             
-        answer = ask_ai_with_context(question, model)
+        answer = ask_ai_with_context(question, model, reranker=reranker, expander=expander)
         print(f"\n🤖 Respuesta: {answer}")
 
 if __name__ == "__main__":
@@ -1,77 +1,96 @@
 import os
-import markdown
-from bs4 import BeautifulSoup
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
-import chromadb
-
-def extract_text_from_markdown(md_file):
-    """ Leer archivo Markdown y extraer el texto plano """
-    with open(md_file, "r", encoding="utf-8") as f:
-        md_content = f.read()
-    
-    # Convertir a HTML y eliminar el formato
-    html_content = markdown.markdown(md_content)
-    soup = BeautifulSoup(html_content, "html.parser")
-    return soup.get_text()
+from dedupe import deduplicate_chunks
+from embedding_backends import load_backend
+from index_versions import create_version, garbage_collect, publish, resolve
+from markdown_chunker import chunk_markdown, chunk_metadata
 
 def load_markdown_files(folder):
-    """ Leer recursivamente todos los archivos Markdown en la carpeta y subcarpetas """
-    all_texts = []
+    """ Leer recursivamente todos los archivos Markdown en la carpeta y subcarpetas
+
+    El contenido se devuelve sin convertir a texto plano para conservar los
+    títulos y tablas que usa el chunker estructural.
+    """
+    documents = []
     
     for root, _, files in os.walk(folder):  # Usar os.walk para recorrer todas las subcarpetas
         for filename in files:
             if filename.endswith(".md"):
                 file_path = os.path.join(root, filename)
-                text = extract_text_from_markdown(file_path)
-                all_texts.append(text)
+                with open(file_path, "r", encoding="utf-8") as f:
+                    documents.append((os.path.relpath(file_path, folder), f.read()))
                 
-    return all_texts
+    return documents
 
-def chunk_texts(texts, chunk_size=500, chunk_overlap=50):
-    """ Dividir el texto en fragmentos """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+def chunk_texts(documents, chunk_size=500, chunk_overlap=50):
+    """ Dividir los documentos en fragmentos por secciones, guardando su ruta de títulos """
     chunks = []
-    for text in texts:
-        chunks.extend(text_splitter.split_text(text))
-    return chunks
+    metadatas = []
+    for source, text in documents:
+        for chunk in chunk_markdown(text, chunk_size=chunk_size, overlap=chunk_overlap):
+            chunks.append(chunk.text)
+            metadatas.append({"source": source, **chunk_metadata(chunk)})
+    return chunks, metadatas
 
 def compute_embeddings(chunks):
-    """ Calcular las incrustaciones usando un modelo local """
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = model.encode(chunks, convert_to_numpy=True)
+    """ Calcular las incrustaciones usando un modelo local (backend según EMBEDDING_BACKEND) """
+    model = load_backend()
+    embeddings = model.encode(chunks, batch_size=64)
     return embeddings, model
 
-def store_in_chromadb(chunks, embeddings):
-    """ Almacenar en ChromaDB """
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    collection = chroma_client.get_or_create_collection(name="markdown_docs")
+def store_in_chromadb(chunks, embeddings, metadatas=None, chroma_path="./chroma_db",
+                      collection_name="markdown_docs", batch_size=500, progress=None,
+                      version=None, publish_version=True):
+    """ Almacenar en ChromaDB por lotes, informando del avance a `progress(hechos, total)` si se indica
+
+    Los fragmentos se escriben en una versión nueva de la colección mientras
+    las consultas siguen usando la activa. Con `publish_version` el alias
+    `collection_name` pasa a la versión nueva tras una consulta de prueba.
+    Devuelve el nombre de la versión creada (None si no hay fragmentos).
+    """
+    if not chunks:
+        print("No hay fragmentos que almacenar; la versión activa no cambia")
+        return None
+
+    name, _, collection = create_version(chroma_path, collection_name, version)
     
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+    for start in range(0, len(chunks), batch_size):
+        end = min(start + batch_size, len(chunks))
         collection.add(
-            ids=[str(i)],
-            embeddings=[embedding.tolist()],
-            metadatas=[{"source": f"Fragmento Markdown {i}"}],
-            documents=[chunk]
+            ids=[str(i) for i in range(start, end)],
+            embeddings=[embedding.tolist() for embedding in embeddings[start:end]],
+            metadatas=[metadatas[i] if metadatas else {"source": f"Fragmento Markdown {i}"} for i in range(start, end)],
+            documents=chunks[start:end]
         )
+        if progress is not None:
+            progress(end, len(chunks))
     print("¡Datos almacenados en ChromaDB con éxito!")
 
+    if publish_version:
+        publish(chroma_path, collection_name, name, query_embedding=embeddings[0])
+        garbage_collect(chroma_path, collection_name)
+    return name
+
 def query_chromadb(query_text, model, top_n=3):
     """ Realizar búsqueda de similitud en ChromaDB """
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    collection = chroma_client.get_collection(name="markdown_docs")
+    import chromadb
+
+    path, _ = resolve("./chroma_db", "markdown_docs")
+    collection = chromadb.PersistentClient(path=path).get_collection(name="markdown_docs")
     query_embedding = model.encode([query_text])[0].tolist()
     results = collection.query(query_embeddings=[query_embedding], n_results=top_n)
     
-    for doc, score in zip(results["documents"][0], results["distances"][0]):
-        print(f"Fragmento relacionado: {doc} (Similitud: {score})")
+    for doc, metadata, score in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
+        print(f"Fragmento relacionado ({metadata.get('section', '')}): {doc} (Similitud: {score})")
 
 if __name__ == "__main__":
     folder_path = "./markdown_pages"  # Ruta de tu carpeta Markdown
-    texts = load_markdown_files(folder_path)
-    chunks = chunk_texts(texts)
+    documents = load_markdown_files(folder_path)
+    chunks, metadatas = chunk_texts(documents)
+    # Embeber un solo representante de cada grupo de fragmentos casi idénticos
+    kept, metadatas = deduplicate_chunks(chunks, metadatas)
+    chunks = [chunks[i] for i in kept]
     embeddings, model = compute_embeddings(chunks)
-    store_in_chromadb(chunks, embeddings)
+    store_in_chromadb(chunks, embeddings, metadatas)
     
     # Prueba de búsqueda
     query_text = "Secretaria"
@@ -0,0 +1,103 @@
+import hashlib
+import re
+from collections import defaultdict
+
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _shingle_hashes(text, k=5):
+    """ Hashes de 32 bits de los k-gramas de palabras del texto normalizado """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < k:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+        dtype=np.uint64
+    )
+
+
+class MinHasher:
+    """ Firmas MinHash con `num_perm` permutaciones universales (a·x + b mod p) """
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, (1 << 61) - 1, num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, (1 << 61) - 1, num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        hashes = _shingle_hashes(text)
+        permuted = np.bitwise_and((hashes[:, np.newaxis] * self.a + self.b) % MERSENNE_PRIME, MAX_HASH)
+        return permuted.min(axis=0)
+
+
+def _bands_for(threshold, num_perm):
+    """ Elegir bandas y filas cuyo umbral LSH, (1/b)^(1/r), queda justo por debajo de `threshold` """
+    best = None
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        lsh_threshold = (1 / bands) ** (1 / rows)
+        if lsh_threshold <= threshold and (best is None or lsh_threshold > best[2]):
+            best = (bands, rows, lsh_threshold)
+    return best[:2]
+
+
+def deduplicate_chunks(chunks, metadatas, threshold=0.8, source_key="source", num_perm=128):
+    """
+    Agrupar fragmentos casi idénticos (mismo contenido en en/es/ca o bajo varias
+    URLs) y quedarse con un representante por grupo.
+
+    Los candidatos se obtienen con LSH por bandas sobre firmas MinHash y se
+    confirman comparando la similitud de Jaccard estimada con `threshold`. El
+    representante es la primera aparición; sus metadatos guardan todas las
+    fuentes del grupo en "sources" (separadas por "|") y su tamaño en
+    "duplicate_count".
+
+    Returns:
+        tuple: (índices de los fragmentos conservados, sus metadatos)
+    """
+    hasher = MinHasher(num_perm=num_perm)
+    bands, rows = _bands_for(threshold, num_perm)
+    buckets = [dict() for _ in range(bands)]
+    representative_of = list(range(len(chunks)))
+    signatures = []
+
+    for i, chunk in enumerate(chunks):
+        signature = hasher.signature(chunk)
+        signatures.append(signature)
+        for band in range(bands):
+            key = signature[band * rows:(band + 1) * rows].tobytes()
+            candidate = buckets[band].get(key)
+            if candidate is None:
+                buckets[band][key] = i
+            elif representative_of[i] == i and np.mean(signatures[candidate] == signature) >= threshold:
+                representative_of[i] = representative_of[candidate]
+
+    groups = defaultdict(list)
+    for i, representative in enumerate(representative_of):
+        groups[representative].append(i)
+
+    kept = sorted(groups)
+    kept_metadatas = []
+    for representative in kept:
+        members = groups[representative]
+        sources = []
+        for member in members:
+            source = str(metadatas[member].get(source_key, ""))
+            if source and source not in sources:
+                sources.append(source)
+        kept_metadatas.append({
+            **metadatas[representative],
+            "sources": "|".join(sources),
+            "duplicate_count": len(members)
+        })
+
+    print(f"🧬 {len(chunks) - len(kept)} fragmentos casi duplicados descartados de {len(chunks)}")
+    return kept, kept_metadatas
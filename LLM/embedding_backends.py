@@ -0,0 +1,213 @@
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_ONNX_DIR = "./models/onnx"
+
+# Umbral mínimo de similitud coseno entre el backend ONNX y el modelo PyTorch
+PARITY_THRESHOLD = 0.99
+
+PARITY_SENTENCES = [
+    "Horari de la secretaria de la FIB",
+    "Calendari acadèmic del curs",
+    "¿Cómo me matriculo en el máster?",
+    "How do I request the final degree project?",
+    "Normativa de permanència i avaluació curricular",
+]
+
+
+class EmbeddingBackend(ABC):
+    """ Interfaz común de los backends de embeddings (compatible con SentenceTransformer.encode) """
+
+    name = "base"
+    model_name = DEFAULT_MODEL_NAME
+
+    @abstractmethod
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """ Embeddings de `sentences` como array de numpy (uno por frase) """
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """ Backend de referencia: SentenceTransformer en PyTorch """
+
+    name = "torch"
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        return self.model.encode(sentences, batch_size=batch_size, convert_to_numpy=True)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    Backend ONNX Runtime para CPU, sin importar torch.
+
+    Reproduce el pipeline de all-MiniLM-L6-v2: transformer, mean pooling
+    sobre la máscara de atención y normalización L2. Los textos se ordenan por
+    longitud antes de agruparlos para minimizar el padding en la ingesta masiva.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir=DEFAULT_ONNX_DIR, quantized=True, max_length=256, num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.model_name = _read_model_name(model_dir)
+        self.quantized = quantized
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size=batch_size)[0]
+
+        if not sentences:
+            return np.empty((0, 0), dtype=np.float32)
+
+        order = np.argsort([len(sentence) for sentence in sentences])
+        result = None
+        for start in range(0, len(sentences), batch_size):
+            indices = order[start:start + batch_size]
+            batch = self._encode_batch([sentences[i] for i in indices])
+            if result is None:
+                result = np.empty((len(sentences), batch.shape[1]), dtype=np.float32)
+            result[indices] = batch
+        return result
+
+    def _encode_batch(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling teniendo en cuenta solo los tokens reales
+        mask = attention_mask[..., np.newaxis].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def _read_model_name(model_dir):
+    path = os.path.join(model_dir, "model_name.txt")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    return DEFAULT_MODEL_NAME
+
+
+def export_onnx(model_name=DEFAULT_MODEL_NAME, output_dir=DEFAULT_ONNX_DIR, quantize=True, opset=14):
+    """ Exportar el transformer a ONNX (una sola vez) y, opcionalmente, cuantizarlo a int8 """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name)
+    model.eval()
+
+    dummy = tokenizer(["texto de ejemplo"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset
+        )
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "model_name.txt"), "w", encoding="utf-8") as f:
+        f.write(model_name)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(model_path, os.path.join(output_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    print(f"✅ Modelo {model_name} exportado a ONNX en {output_dir}")
+    return model_path
+
+
+def check_parity(backend, reference, sentences=PARITY_SENTENCES, threshold=PARITY_THRESHOLD):
+    """ Comparar por similitud coseno los embeddings de un backend con los del modelo de referencia """
+    ours = np.asarray(backend.encode(sentences), dtype=np.float32)
+    theirs = np.asarray(reference.encode(sentences), dtype=np.float32)
+    ours /= np.linalg.norm(ours, axis=1, keepdims=True)
+    theirs /= np.linalg.norm(theirs, axis=1, keepdims=True)
+    similarities = (ours * theirs).sum(axis=1)
+
+    result = {
+        "min": float(similarities.min()),
+        "mean": float(similarities.mean()),
+        "ok": bool(similarities.min() >= threshold)
+    }
+    if not result["ok"]:
+        raise ValueError(
+            f"El backend {backend.name} se desvía del modelo de referencia "
+            f"(similitud coseno mínima {result['min']:.4f} < {threshold})"
+        )
+    return result
+
+
+def load_backend(kind=None, model_name=DEFAULT_MODEL_NAME, onnx_dir=DEFAULT_ONNX_DIR):
+    """
+    Cargar el backend indicado en EMBEDDING_BACKEND: "torch" (por defecto),
+    "onnx" (float32) o "onnx-int8" (cuantizado dinámicamente).
+    """
+    kind = kind or os.getenv("EMBEDDING_BACKEND", "torch")
+    if kind == "torch":
+        return SentenceTransformerBackend(model_name)
+    if kind in ("onnx", "onnx-int8"):
+        backend = OnnxBackend(onnx_dir, quantized=(kind == "onnx-int8"))
+        if backend.model_name != model_name:
+            raise ValueError(
+                f"El modelo ONNX de {onnx_dir} es {backend.model_name}, no {model_name}; vuelve a exportarlo"
+            )
+        backend.name = kind
+        return backend
+    raise ValueError(f"Backend de embeddings desconocido: {kind}")
+
+
+if __name__ == "__main__":
+    # Exportar el modelo una vez y verificar que ambos backends ONNX coinciden con PyTorch
+    export_onnx()
+    reference = SentenceTransformerBackend()
+    for kind in ("onnx", "onnx-int8"):
+        parity = check_parity(load_backend(kind), reference)
+        print(f"🔍 Paridad {kind}: similitud coseno mínima {parity['min']:.4f}, media {parity['mean']:.4f}")
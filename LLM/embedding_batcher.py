@@ -0,0 +1,123 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Agrupa las consultas que llegan casi a la vez en una única llamada a `encode`.
+
+    Cada llamada a `submit` devuelve un Future. Un hilo de fondo espera como
+    máximo `max_wait_ms` milisegundos (o hasta reunir `max_batch_size` textos),
+    calcula todos los embeddings de una vez y resuelve el Future de cada
+    llamante. Expone también `encode`, compatible con SentenceTransformer, para
+    poder usarse en lugar del modelo en `query_chromadb`.
+    """
+
+    _STOP = object()
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        """ Encolar un texto y devolver un Future con su embedding """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, sentences, **kwargs):
+        """
+        Calcular embeddings con la misma interfaz que SentenceTransformer.encode.
+
+        Solo se encolan las llamadas sin opciones: el lote compartido se calcula
+        con las de por defecto, así que con `kwargs` (p. ej. `normalize_embeddings`)
+        se llama directamente al modelo, sea cual sea el tamaño de la entrada.
+        """
+        single = isinstance(sentences, str)
+        # Los lotes grandes (ingesta) ya están vectorizados: no tiene sentido encolarlos
+        if kwargs or (not single and len(sentences) > self.max_batch_size):
+            options = {"convert_to_numpy": True, **kwargs}
+            embeddings = self.model.encode([sentences] if single else sentences, **options)
+            return embeddings[0] if single else embeddings
+
+        if single:
+            return self.submit(sentences).result()
+
+        futures = [self.submit(sentence) for sentence in sentences]
+        return np.stack([future.result() for future in futures])
+
+    async def encode_async(self, text):
+        """ Versión asíncrona para usar desde el event loop sin bloquearlo """
+        return await asyncio.wrap_future(self.submit(text))
+
+    def close(self):
+        """ Detener el hilo de fondo tras procesar lo que quede en la cola """
+        with self._lock:
+            if self._worker is not None:
+                self._queue.put(self._STOP)
+                self._worker.join()
+                self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                # Reencolar la señal de parada para salir tras este lote
+                self._queue.put(item)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+
+            # Descartar las peticiones que se cancelaron mientras esperaban
+            batch = [
+                (text, future) for text, future in self._collect_batch(item)
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            try:
+                embeddings = self.model.encode(
+                    [text for text, _ in batch],
+                    convert_to_numpy=True,
+                    batch_size=len(batch)
+                )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
@@ -0,0 +1,102 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    """ Normalizar una pregunta: minúsculas, sin acentos y con espacios colapsados """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text.casefold()).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Caché LRU de embeddings de preguntas exactas (tras normalizar).
+
+    Envuelve un codificador (SentenceTransformer, EmbeddingBatcher...) y
+    expone la misma interfaz `encode`. Las claves incluyen el nombre del modelo
+    de embeddings, de modo que cambiar de modelo nunca devuelve vectores
+    antiguos. Los vectores se guardan como float32 para ocupar la mitad que
+    los float64 por defecto.
+    """
+
+    def __init__(self, encoder, model_name, max_entries=10000, ttl_seconds=3600):
+        self.encoder = encoder
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_model(self, encoder, model_name):
+        """ Cambiar el modelo de embeddings; las entradas del anterior se descartan """
+        with self._lock:
+            if model_name != self.model_name:
+                self._entries.clear()
+            self.encoder = encoder
+            self.model_name = model_name
+
+    def get(self, text):
+        key = (self.model_name, normalize_query(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            embedding, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text, embedding):
+        key = (self.model_name, normalize_query(text))
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def encode(self, sentences, **kwargs):
+        """ Devolver embeddings desde la caché y calcular solo los que faltan """
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        results = [self.get(sentence) for sentence in sentences]
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        if missing:
+            computed = self.encoder.encode([sentences[i] for i in missing], **kwargs)
+            for i, embedding in zip(missing, computed):
+                self.put(sentences[i], embedding)
+                results[i] = np.asarray(embedding, dtype=np.float32)
+
+        embeddings = np.stack(results)
+        return embeddings[0] if single else embeddings
+
+    def stats(self):
+        """ Estadísticas de uso para exportar (aciertos, fallos y tasa de acierto) """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
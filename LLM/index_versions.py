@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+ALIASES_FILE = "aliases.json"
+LOCK_FILE = "aliases.lock"
+VERSIONS_DIR = "versions"
+VERSION_INFO_FILE = "version.json"
+
+# Las versiones retiradas se conservan este tiempo para poder volver atrás
+DEFAULT_GRACE_SECONDS = float(os.getenv("INDEX_RETENTION_HOURS", "24")) * 3600
+
+
+def version_name(alias, version=None):
+    """ Nombre de una versión: `alias__versión` (por defecto, la fecha actual) """
+    return f"{alias}__{version or datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+
+
+def version_path(chroma_path, name):
+    """
+    Directorio de una versión. Cada versión es un almacén de ChromaDB propio:
+    solo la abre el proceso que la construye hasta que se publica, y después
+    solo la leen los procesos que sirven consultas (ChromaDB no admite varios
+    procesos escribiendo en el mismo directorio).
+    """
+    return os.path.join(chroma_path, VERSIONS_DIR, name)
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Lock exclusivo entre procesos sobre el archivo `path` (flock en POSIX,
+    msvcrt en Windows). El sistema lo libera si el proceso muere.
+    """
+    with open(path, "a+") as lock:
+        if os.name == "nt":
+            import msvcrt
+
+            lock.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK se rinde tras diez reintentos de un segundo
+                    continue
+            try:
+                yield
+            finally:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _locked(chroma_path):
+    # Serializa la lectura-modificación-escritura de aliases.json entre procesos
+    os.makedirs(chroma_path, exist_ok=True)
+    with file_lock(os.path.join(chroma_path, LOCK_FILE)):
+        yield
+
+
+def _aliases_path(chroma_path):
+    return os.path.join(chroma_path, ALIASES_FILE)
+
+
+def load_aliases(chroma_path):
+    try:
+        with open(_aliases_path(chroma_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_aliases(chroma_path, aliases):
+    # Escritura atómica: los lectores ven el alias anterior o el nuevo, nunca uno a medias
+    path = _aliases_path(chroma_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def resolve(chroma_path, alias):
+    """
+    Devolver (directorio de la versión activa, metadatos de la publicación) de
+    un alias; la colección dentro del directorio se llama como el alias. Sin
+    publicaciones previas se usa el propio `chroma_path`.
+    """
+    entry = load_aliases(chroma_path).get(alias)
+    if not entry:
+        return chroma_path, {}
+    return version_path(chroma_path, entry["current"]), entry.get("metadata", {})
+
+
+def _published_names(entry):
+    return {entry["current"]} | {retired["name"] for retired in entry["retired"]}
+
+
+def create_version(chroma_path, alias, version=None, metadata=None):
+    """
+    Crear el directorio de una versión nueva con su colección vacía (el alias
+    sigue apuntando a la activa). Si quedan restos de un intento anterior sin
+    publicar con el mismo nombre, se descartan.
+
+    Returns:
+        tuple: (nombre de la versión, cliente, colección)
+    """
+    import chromadb
+
+    name = version_name(alias, version)
+    path = version_path(chroma_path, name)
+    entry = load_aliases(chroma_path).get(alias)
+    if entry and name in _published_names(entry):
+        raise ValueError(f"La versión {name} ya se ha publicado")
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    with open(os.path.join(path, VERSION_INFO_FILE), "w", encoding="utf-8") as f:
+        json.dump({"alias": alias, "created_at": time.time()}, f)
+
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection(name=alias, metadata=metadata)
+    return name, client, collection
+
+
+def smoke_test(collection, query_embedding=None, query_text=None):
+    """
+    Comprobar que la colección nueva tiene datos y responde a una consulta
+    (por texto, por embedding o, si no se indica ninguno, con el primer
+    embedding almacenado).
+    """
+    if collection.count() == 0:
+        raise ValueError(f"La colección {collection.name} está vacía")
+    if query_embedding is None and query_text is None:
+        query_embedding = collection.get(limit=1, include=["embeddings"])["embeddings"][0]
+    if query_embedding is not None:
+        results = collection.query(query_embeddings=[[float(x) for x in query_embedding]], n_results=1)
+    else:
+        results = collection.query(query_texts=[query_text or "FIB"], n_results=1)
+    if not results["ids"] or not results["ids"][0]:
+        raise ValueError(f"La colección {collection.name} no devuelve resultados")
+
+
+def publish(chroma_path, alias, name, query_embedding=None, query_text=None, metadata=None):
+    """
+    Activar la versión `name` del alias tras una consulta de prueba.
+
+    La versión anterior queda retirada (con la fecha de retirada) para poder
+    volver a ella con `rollback` hasta que `garbage_collect` la elimine. Si la
+    prueba falla se lanza una excepción y el alias no cambia.
+    """
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=version_path(chroma_path, name)).get_collection(name=alias)
+    smoke_test(collection, query_embedding, query_text)
+
+    with _locked(chroma_path):
+        aliases = load_aliases(chroma_path)
+        entry = aliases.get(alias, {"current": None, "retired": []})
+        if entry["current"] and entry["current"] != name:
+            entry["retired"].insert(0, {"name": entry["current"], "metadata": entry.get("metadata", {}),
+                                        "retired_at": time.time()})
+        entry["retired"] = [retired for retired in entry["retired"] if retired["name"] != name]
+        entry.update(current=name, metadata=metadata or {}, published_at=time.time())
+        aliases[alias] = entry
+        _save_aliases(chroma_path, aliases)
+    print(f"🔀 Alias {alias} → {name}")
+    return entry
+
+
+def rollback(chroma_path, alias):
+    """ Volver a la versión retirada más reciente que todavía exista """
+    with _locked(chroma_path):
+        aliases = load_aliases(chroma_path)
+        entry = aliases.get(alias)
+        while entry and entry["retired"]:
+            previous = entry["retired"].pop(0)
+            if os.path.isdir(version_path(chroma_path, previous["name"])):
+                entry["retired"].insert(0, {"name": entry["current"], "metadata": entry.get("metadata", {}),
+                                            "retired_at": time.time()})
+                entry.update(current=previous["name"], metadata=previous["metadata"], published_at=time.time())
+                _save_aliases(chroma_path, aliases)
+                print(f"↩️ Alias {alias} → {previous['name']}")
+                return entry
+    raise ValueError(f"No hay ninguna versión anterior de {alias} a la que volver")
+
+
+def _created_at(path):
+    try:
+        with open(os.path.join(path, VERSION_INFO_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)["created_at"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return os.path.getmtime(path)
+
+
+def garbage_collect(chroma_path, alias, grace_seconds=DEFAULT_GRACE_SECONDS, keep=1):
+    """
+    Eliminar las versiones retiradas hace más de `grace_seconds` (conservando
+    siempre las `keep` más recientes) y las versiones que nunca se publicaron,
+    como las de ingestas fallidas, pasado el mismo plazo.
+    """
+    versions_dir = os.path.join(chroma_path, VERSIONS_DIR)
+    now = time.time()
+    deleted = []
+
+    with _locked(chroma_path):
+        aliases = load_aliases(chroma_path)
+        entry = aliases.get(alias, {"current": None, "retired": []})
+
+        retained = entry["retired"][:keep]
+        expired = []
+        for retired in entry["retired"][keep:]:
+            (expired if now - retired["retired_at"] > grace_seconds else retained).append(retired)
+        known = {entry["current"]} | {retired["name"] for retired in retained}
+        expired_names = {retired["name"] for retired in expired}
+
+        names = os.listdir(versions_dir) if os.path.isdir(versions_dir) else []
+        for name in names:
+            if not name.startswith(f"{alias}__") or name in known:
+                continue
+            path = version_path(chroma_path, name)
+            # Versión sin publicar: puede ser una ingesta todavía en curso
+            if name not in expired_names and now - _created_at(path) <= grace_seconds:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            deleted.append(name)
+
+        if alias in aliases:
+            entry["retired"] = retained
+            _save_aliases(chroma_path, aliases)
+
+    if deleted:
+        print(f"🗑️ Versiones eliminadas de {alias}: {', '.join(deleted)}")
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versiones de colecciones de ChromaDB")
+    parser.add_argument("command", choices=["list", "rollback", "gc"])
+    parser.add_argument("alias", nargs="?", default="markdown_docs")
+    parser.add_argument("--chroma-path", default="./chroma_db")
+    args = parser.parse_args()
+
+    if args.command == "rollback":
+        rollback(args.chroma_path, args.alias)
+    elif args.command == "gc":
+        garbage_collect(args.chroma_path, args.alias)
+    print(json.dumps(load_aliases(args.chroma_path).get(args.alias, {}), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,186 +2,368 @@
 # Importación de bibliotecas
 import os
 import re
+import argparse
 import json
 import glob
-import pandas as pd
+import numpy as np
 import networkx as nx
-import matplotlib.pyplot as plt
-from collections import defaultdict
-import nltk
-from nltk.tokenize import word_tokenize, sent_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.tag import pos_tag
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# NLTK y matplotlib se importan al usarse: importar este módulo no carga ni descarga nada
 
-# Configuración e instalación de dependencias
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-    nltk.data.find('taggers/averaged_perceptron_tagger')
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    print("Descargando recursos de NLTK...")
-    nltk.download('punkt')
-    nltk.download('stopwords')
-    nltk.download('averaged_perceptron_tagger')
-    nltk.download('wordnet')
-
-
-# Función para leer archivos markdown
-def leer_archivos_markdown(directorio="markdown_pages"):
-    """Lee todos los archivos markdown en el directorio especificado."""
-    archivos = {}
 
+# Configuración e instalación de dependencias
+def asegurar_recursos_nltk():
+    """Descarga los recursos de NLTK que falten."""
+    import nltk
+
+    try:
+        nltk.data.find('tokenizers/punkt')
+        nltk.data.find('corpora/stopwords')
+        nltk.data.find('taggers/averaged_perceptron_tagger')
+        nltk.data.find('corpora/wordnet')
+    except LookupError:
+        print("Descargando recursos de NLTK...")
+        nltk.download('punkt')
+        nltk.download('stopwords')
+        nltk.download('averaged_perceptron_tagger')
+        nltk.download('wordnet')
+
+
+# Función para listar archivos markdown
+def listar_archivos_markdown(directorio="markdown_pages"):
+    """Devuelve [(nombre relativo, ruta)] de los archivos markdown, sin leer su contenido."""
     if not os.path.exists(directorio):
         print(f"El directorio {directorio} no existe.")
-        return archivos
+        return []
 
     patron = os.path.join(directorio, "**", "*.md")
-    rutas = glob.glob(patron, recursive=True)
+    rutas = sorted(glob.glob(patron, recursive=True))
+    return [(os.path.relpath(ruta, directorio), ruta) for ruta in rutas]
+
+
+def leer_archivo(ruta):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            return archivo.read()
+    except Exception as e:
+        print(f"Error al leer {ruta}: {e}")
+        return None
+
+
+# Patrones para encontrar acrónimos y sus definiciones (compilados una sola vez)
+PATRON_ACRONIMO = re.compile(r'\b([A-Z]{2,})\b')
+# Patrón 1: "ACRONIMO (definición)"
+PATRON_DEFINICION_POSTERIOR = re.compile(r'\b([A-Z]{2,})\s*\(([^)]+)\)')
+# Patrón 2: "definición (ACRONIMO)"
+PATRON_DEFINICION_ANTERIOR = re.compile(r'([^()\n]+)\s*\(\s*([A-Z]{2,})\s*\)')
+
+
+def acronimos_de_archivo(contenido):
+    """
+    Devuelve {acrónimo: definición o None} de un archivo. Las definiciones se
+    buscan con un único recorrido del texto por patrón, no una vez por aparición.
+    """
+    posteriores = {}
+    for match in PATRON_DEFINICION_POSTERIOR.finditer(contenido):
+        posteriores.setdefault(match.group(1), match.group(2).strip())
+
+    anteriores = {}
+    for match in PATRON_DEFINICION_ANTERIOR.finditer(contenido):
+        anteriores.setdefault(match.group(2), match.group(1).strip())
+
+    return {
+        acronimo: posteriores.get(acronimo) or anteriores.get(acronimo)
+        for acronimo in dict.fromkeys(PATRON_ACRONIMO.findall(contenido))
+    }
 
-    for ruta in rutas:
-        try:
-            with open(ruta, 'r', encoding='utf-8') as archivo:
-                contenido = archivo.read()
-                nombre_archivo = os.path.relpath(ruta, directorio)
-                archivos[nombre_archivo] = contenido
-        except Exception as e:
-            print(f"Error al leer {ruta}: {e}")
 
-    print(f"Se leyeron {len(archivos)} archivos markdown.")
-    return archivos
+# Recursos NLTK de cada proceso: se cargan una vez por worker, no por archivo
+_recursos_nltk = {}
+
+
+def obtener_recursos_nltk():
+    if not _recursos_nltk:
+        from nltk.corpus import stopwords
+        from nltk.stem import WordNetLemmatizer
+        from nltk.tag import pos_tag
+        from nltk.tokenize import sent_tokenize, word_tokenize
+
+        asegurar_recursos_nltk()
+        _recursos_nltk["stop_words"] = set(stopwords.words('spanish'))
+        _recursos_nltk["lemmatizer"] = WordNetLemmatizer()
+        _recursos_nltk["sent_tokenize"] = sent_tokenize
+        _recursos_nltk["word_tokenize"] = word_tokenize
+        _recursos_nltk["pos_tag"] = pos_tag
+    return _recursos_nltk
+
+
+def terminos_de_archivo(contenido):
+    """Devuelve {término: ocurrencias} con los sustantivos y frases nominales de un archivo."""
+    recursos = obtener_recursos_nltk()
+    stop_words = recursos["stop_words"]
+    lemmatizer = recursos["lemmatizer"]
+    word_tokenize, pos_tag = recursos["word_tokenize"], recursos["pos_tag"]
+    terminos = defaultdict(int)
+
+    # Tokenizar por oraciones y luego por palabras
+    sentencias = recursos["sent_tokenize"](contenido)
+    for sentencia in sentencias:
+        palabras = word_tokenize(sentencia)
+        # Filtrar stopwords y etiquetas POS
+        palabras_filtradas = [palabra.lower() for palabra in palabras
+                              if palabra.isalpha() and palabra.lower() not in stop_words]
+
+        # Etiquetar partes del discurso
+        etiquetadas = pos_tag(palabras_filtradas)
+
+        # Extraer sustantivos y frases nominales
+        i = 0
+        while i < len(etiquetadas):
+            palabra, etiqueta = etiquetadas[i]
+
+            # Si es un sustantivo, verificar si forma parte de una frase nominal
+            if etiqueta.startswith('NN'):
+                # Intentar formar una frase nominal (sustantivo + sustantivo)
+                frase = palabra
+                j = i + 1
+                while j < len(etiquetadas) and etiquetadas[j][1].startswith('NN'):
+                    frase += " " + etiquetadas[j][0]
+                    j += 1
+
+                if j > i + 1:  # Si se encontró una frase nominal
+                    termino = frase
+                    i = j - 1  # Avanzar el índice
+                else:
+                    # Usar solo el sustantivo individual
+                    termino = lemmatizer.lemmatize(palabra)
 
+                # Registrar el término
+                terminos[termino] += 1
+            i += 1
 
-# Función para extraer acrónimos y definiciones
-def extraer_acronimos(contenido_archivos):
-    """Extrae acrónimos y sus posibles definiciones de los archivos."""
-    acronimos = {}
+    return dict(terminos)
 
-    # Patrones para encontrar acrónimos
-    patron_acronimo = r'\b([A-Z]{2,})\b'
-
-    for archivo, contenido in contenido_archivos.items():
-        # Encontrar todos los acrónimos en el texto
-        encontrados = re.findall(patron_acronimo, contenido)
-
-        for acronimo in encontrados:
-            if len(acronimo) >= 2:  # Solo considerar acrónimos de al menos 2 letras
-                # Buscar posibles definiciones
-                # Patrón 1: "ACRONIMO (definición)"
-                patron1 = rf'{acronimo}\s*\(([^)]+)\)'
-                # Patrón 2: "definición (ACRONIMO)"
-                patron2 = r'([^(]+)\s*\(\s*' + acronimo + r'\s*\)'
-
-                definicion = None
-                match1 = re.search(patron1, contenido)
-                if match1:
-                    definicion = match1.group(1).strip()
-                else:
-                    match2 = re.search(patron2, contenido)
-                    if match2:
-                        definicion = match2.group(1).strip()
 
-                if acronimo not in acronimos:
-                    acronimos[acronimo] = {"definicion": definicion, "archivos": []}
+def combinar_acronimos(acronimos, nombre_archivo, parciales):
+    """Fase reduce: añade los acrónimos de un archivo al diccionario global."""
+    for acronimo, definicion in parciales.items():
+        if acronimo not in acronimos:
+            acronimos[acronimo] = {"definicion": definicion, "archivos": []}
+        elif acronimos[acronimo]["definicion"] is None:
+            acronimos[acronimo]["definicion"] = definicion
 
-                # Añadir archivo a la lista de archivos donde aparece
-                if archivo not in acronimos[acronimo]["archivos"]:
-                    acronimos[acronimo]["archivos"].append(archivo)
+        # Añadir archivo a la lista de archivos donde aparece
+        if nombre_archivo not in acronimos[acronimo]["archivos"]:
+            acronimos[acronimo]["archivos"].append(nombre_archivo)
 
-    print(f"Se encontraron {len(acronimos)} acrónimos únicos.")
-    return acronimos
 
+def combinar_terminos(terminos, nombre_archivo, parciales):
+    """Fase reduce: suma las ocurrencias de los términos de un archivo."""
+    for termino, ocurrencias in parciales.items():
+        terminos[termino]["ocurrencias"] += ocurrencias
+        if nombre_archivo not in terminos[termino]["archivos"]:
+            terminos[termino]["archivos"].append(nombre_archivo)
 
-# Función para extraer términos importantes
-def extraer_terminos(contenido_archivos):
-    """Extrae términos y conceptos importantes de los documentos."""
-    terminos = defaultdict(lambda: {"ocurrencias": 0, "archivos": []})
-    stop_words = set(stopwords.words('spanish'))
-    lemmatizer = WordNetLemmatizer()
-
-    for archivo, contenido in contenido_archivos.items():
-        # Tokenizar por oraciones y luego por palabras
-        sentencias = sent_tokenize(contenido)
-        for sentencia in sentencias:
-            palabras = word_tokenize(sentencia)
-            # Filtrar stopwords y etiquetas POS
-            palabras_filtradas = [palabra.lower() for palabra in palabras
-                                  if palabra.isalpha() and palabra.lower() not in stop_words]
-
-            # Etiquetar partes del discurso
-            etiquetadas = pos_tag(palabras_filtradas)
-
-            # Extraer sustantivos y frases nominales
-            i = 0
-            while i < len(etiquetadas):
-                palabra, etiqueta = etiquetadas[i]
-
-                # Si es un sustantivo, verificar si forma parte de una frase nominal
-                if etiqueta.startswith('NN'):
-                    # Intentar formar una frase nominal (sustantivo + sustantivo)
-                    frase = palabra
-                    j = i + 1
-                    while j < len(etiquetadas) and etiquetadas[j][1].startswith('NN'):
-                        frase += " " + etiquetadas[j][0]
-                        j += 1
-
-                    if j > i + 1:  # Si se encontró una frase nominal
-                        termino = frase
-                        i = j - 1  # Avanzar el índice
-                    else:
-                        # Usar solo el sustantivo individual
-                        termino = lemmatizer.lemmatize(palabra)
-
-                    # Registrar el término
-                    terminos[termino]["ocurrencias"] += 1
-                    if archivo not in terminos[termino]["archivos"]:
-                        terminos[termino]["archivos"].append(archivo)
-                i += 1
 
+def filtrar_terminos(terminos):
     # Filtrar términos con pocas ocurrencias
     terminos_filtrados = {k: v for k, v in terminos.items() if v["ocurrencias"] > 1}
     print(f"Se extrajeron {len(terminos_filtrados)} términos relevantes.")
     return terminos_filtrados
 
 
-# Función para crear relaciones entre términos
-def crear_relaciones(acronimos, terminos, contenido_archivos):
-    """Crea relaciones entre términos y acrónimos basados en co-ocurrencia."""
-    relaciones = []
+# Distancia máxima (en caracteres) para considerar que dos elementos co-ocurren
+VENTANA_COOCURRENCIA = 500
+
+PATRON_TOKEN = re.compile(r"\w+")
+
+
+def construir_indice_frases(elementos):
+    """Construye un trie de tokens con los elementos (acrónimos y frases de varias palabras)."""
+    trie = {}
+    for indice, elemento in enumerate(elementos):
+        tokens = PATRON_TOKEN.findall(elemento.lower())
+        if not tokens:
+            continue
+        nodo = trie
+        for token in tokens:
+            nodo = nodo.setdefault(token, {})
+        nodo.setdefault(None, []).append(indice)
+    return trie
+
+
+def buscar_ocurrencias(contenido, trie):
+    """
+    Recorre el texto una sola vez y devuelve las ocurrencias [(posición, índice)]
+    de todos los elementos del trie, en orden de aparición.
+    """
+    tokens = [(m.group(), m.start()) for m in PATRON_TOKEN.finditer(contenido.lower())]
+    ocurrencias = []
+    for i, (token, posicion) in enumerate(tokens):
+        nodo = trie.get(token)
+        j = i + 1
+        while nodo is not None:
+            for indice in nodo.get(None, ()):
+                ocurrencias.append((posicion, indice))
+            if j >= len(tokens):
+                break
+            nodo = nodo.get(tokens[j][0])
+            j += 1
+    return ocurrencias
+
+
+def contar_coocurrencias(ocurrencias, ventana=VENTANA_COOCURRENCIA):
+    """
+    Calcula a partir de las ocurrencias ordenadas, con una ventana deslizante,
+    cuántas veces co-ocurre cada par de elementos y su distancia mínima.
+
+    Returns:
+        dict: {(índice1, índice2): [coocurrencias, distancia mínima]} con índice1 < índice2
+    """
+    pares = {}
+    en_ventana = deque()
+    for posicion, indice in ocurrencias:
+        while en_ventana and posicion - en_ventana[0][0] >= ventana:
+            en_ventana.popleft()
+        for posicion_previa, indice_previo in en_ventana:
+            if indice_previo == indice:
+                continue
+            par = (indice_previo, indice) if indice_previo < indice else (indice, indice_previo)
+            distancia = posicion - posicion_previa
+            datos = pares.get(par)
+            if datos is None:
+                pares[par] = [1, distancia]
+            else:
+                datos[0] += 1
+                if distancia < datos[1]:
+                    datos[1] = distancia
+        en_ventana.append((posicion, indice))
+    return pares
+
+
+# Actualización incremental: aportaciones por archivo persistidas entre ejecuciones
+def firma_archivo(ruta):
+    """Firma barata para detectar cambios sin leer el archivo: mtime en ns y tamaño."""
+    info = os.stat(ruta)
+    return f"{info.st_mtime_ns}:{info.st_size}"
+
+
+def cargar_estado(ruta_estado):
+    if not os.path.exists(ruta_estado):
+        return {"archivos": {}}
+    with open(ruta_estado, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_estado(estado, ruta_estado):
+    # Escribir en un temporal y renombrar para no dejar nunca un estado a medias
+    temporal = f"{ruta_estado}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False)
+    os.replace(temporal, ruta_estado)
+
+
+def analizar_archivo(nombre_archivo, ruta):
+    """
+    Tarea de un worker: aportación completa de un archivo al diccionario.
+
+    Las co-ocurrencias se calculan con el vocabulario del propio archivo
+    (sus acrónimos y términos), de modo que la aportación no depende del resto
+    del corpus y puede reutilizarse mientras el archivo no cambie.
+    """
+    contenido = leer_archivo(ruta)
+    if contenido is None:
+        return nombre_archivo, None
+    acronimos = acronimos_de_archivo(contenido)
+    terminos = terminos_de_archivo(contenido)
+
+    elementos = list(acronimos) + list(terminos)
+    pares = contar_coocurrencias(buscar_ocurrencias(contenido, construir_indice_frases(elementos)))
+    return nombre_archivo, {
+        "firma": firma_archivo(ruta),
+        "acronimos": acronimos,
+        "terminos": terminos,
+        "pares": [
+            [elementos[indice1], elementos[indice2], coocurrencias, distancia]
+            for (indice1, indice2), (coocurrencias, distancia) in sorted(pares.items())
+        ]
+    }
+
 
-    # Combinar acrónimos y términos para el análisis
-    todos_los_elementos = list(acronimos.keys()) + list(terminos.keys())
+def actualizar_estado(estado, archivos, procesos=None, progreso=None):
+    """
+    Aplica al estado solo los cambios del corpus: vuelve a analizar, en un pool
+    de procesos, los archivos nuevos o modificados y elimina los borrados.
 
-    # Crear matriz de co-ocurrencia
-    for archivo, contenido in contenido_archivos.items():
-        # Verificar qué elementos aparecen en este archivo
-        elementos_presentes = []
-        for elemento in todos_los_elementos:
-            if elemento.lower() in contenido.lower():
-                elementos_presentes.append(elemento)
+    `progreso(hechos, total)` se llama tras cada archivo analizado; si lanza una
+    excepción (p. ej. al cancelar la ingesta) los archivos en cola se descartan.
 
-        # Crear relaciones basadas en co-ocurrencia en el mismo archivo
-        for i in range(len(elementos_presentes)):
-            for j in range(i + 1, len(elementos_presentes)):
-                elemento1 = elementos_presentes[i]
-                elemento2 = elementos_presentes[j]
+    Returns:
+        tuple: (número de archivos analizados, número de archivos eliminados)
+    """
+    aportaciones = estado["archivos"]
+    actuales = dict(archivos)
 
-                # Verificar si están cerca uno del otro en el texto (dentro de la misma sección)
-                contenido_lower = contenido.lower()
-                pos1 = contenido_lower.find(elemento1.lower())
-                pos2 = contenido_lower.find(elemento2.lower())
+    eliminados = [nombre for nombre in aportaciones if nombre not in actuales]
+    for nombre in eliminados:
+        del aportaciones[nombre]
 
-                if pos1 >= 0 and pos2 >= 0:
-                    # Calcular la distancia de texto entre ellos
-                    distancia = abs(pos1 - pos2)
+    pendientes = [
+        (nombre, ruta) for nombre, ruta in archivos
+        if nombre not in aportaciones or aportaciones[nombre]["firma"] != firma_archivo(ruta)
+    ]
+    if pendientes:
+        executor = ProcessPoolExecutor(max_workers=procesos)
+        try:
+            resultados = executor.map(
+                analizar_archivo,
+                [nombre for nombre, _ in pendientes],
+                [ruta for _, ruta in pendientes],
+                chunksize=16)
+            for hechos, (nombre, aportacion) in enumerate(resultados, 1):
+                if aportacion is None:
+                    aportaciones.pop(nombre, None)
+                else:
+                    aportaciones[nombre] = aportacion
+                if progreso is not None:
+                    progreso(hechos, len(pendientes))
+        except BaseException:
+            # Sin esperar a los archivos en cola: la cancelación tiene efecto enseguida
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+    print(f"Archivos analizados: {len(pendientes)}, eliminados: {len(eliminados)}, "
+          f"sin cambios: {len(archivos) - len(pendientes)}")
+    return len(pendientes), len(eliminados)
+
+
+def combinar_estado(estado):
+    """
+    Fase reduce: combina las aportaciones por archivo (sin volver a leer ningún
+    texto) en los acrónimos, términos y relaciones globales.
+    """
+    acronimos = {}
+    terminos = defaultdict(lambda: {"ocurrencias": 0, "archivos": []})
+    aportaciones = estado["archivos"]
 
-                    # Si están relativamente cerca (en el mismo párrafo aproximadamente)
-                    if distancia < 500:  # Un párrafo suele tener menos de 500 caracteres
-                        relaciones.append((elemento1, elemento2, {'archivo': archivo, 'distancia': distancia}))
+    for nombre in sorted(aportaciones):
+        combinar_acronimos(acronimos, nombre, aportaciones[nombre]["acronimos"])
+        combinar_terminos(terminos, nombre, aportaciones[nombre]["terminos"])
+    print(f"Se encontraron {len(acronimos)} acrónimos únicos.")
+    terminos = filtrar_terminos(terminos)
 
+    relaciones = []
+    for nombre in sorted(aportaciones):
+        for origen, destino, coocurrencias, distancia in aportaciones[nombre]["pares"]:
+            if (origen in acronimos or origen in terminos) and (destino in acronimos or destino in terminos):
+                relaciones.append((origen, destino, {
+                    'archivo': nombre, 'distancia': distancia, 'coocurrencias': coocurrencias
+                }))
     print(f"Se crearon {len(relaciones)} relaciones entre términos.")
-    return relaciones
+    return acronimos, terminos, relaciones
 
 
 # Función para crear grafo de conocimiento
@@ -212,9 +394,42 @@ def crear_grafo(acronimos, terminos, relaciones):
     return G
 
 
+# Modos de renderizado del grafo: el completo solo es viable con grafos pequeños
+MODOS_RENDER = ("ninguno", "topk", "comunidad", "completo")
+
+
+def submuestrear_grafo(G, modo="topk", k=150):
+    """
+    Devuelve el subgrafo a dibujar: los `k` nodos más centrales ("topk") o los
+    más centrales de cada una de las comunidades más grandes ("comunidad").
+    """
+    if modo == "completo" or G.number_of_nodes() <= k:
+        return G
+
+    centralidad = nx.degree_centrality(G)
+    if modo == "comunidad":
+        # Propagación de etiquetas: casi lineal en el número de aristas
+        comunidades = sorted(nx.community.label_propagation_communities(G), key=len, reverse=True)
+        comunidades = [c for c in comunidades if len(c) > 1] or comunidades
+        por_comunidad = max(k // min(len(comunidades), 10), 1)
+        nodos = []
+        for comunidad in comunidades[:10]:
+            nodos.extend(sorted(comunidad, key=centralidad.get, reverse=True)[:por_comunidad])
+    else:
+        nodos = sorted(centralidad, key=centralidad.get, reverse=True)[:k]
+
+    return G.subgraph(nodos)
+
+
 # Función para visualizar el grafo
-def visualizar_grafo(G, nombre_archivo="grafo_conocimiento.png"):
+def visualizar_grafo(G, nombre_archivo="grafo_conocimiento.png", modo="topk", k=150):
     """Visualiza y guarda el grafo de conocimiento como imagen."""
+    if modo == "ninguno":
+        return
+
+    import matplotlib.pyplot as plt
+
+    G = submuestrear_grafo(G, modo, k)
     plt.figure(figsize=(12, 12))
 
     # Determinar tamaño de nodos según su importancia
@@ -254,7 +469,40 @@ def visualizar_grafo(G, nombre_archivo="grafo_conocimiento.png"):
     plt.savefig(nombre_archivo, format='png', dpi=300, bbox_inches='tight')
     plt.close()
 
-    print(f"Grafo guardado como {nombre_archivo}")
+    print(f"Grafo guardado como {nombre_archivo} ({G.number_of_nodes()} nodos dibujados)")
+
+
+def exportar_grafo_compacto(G, prefijo="resultados"):
+    """
+    Exporta el grafo en formato CSR para cargarlo rápido en el chatbot:
+    `{prefijo}_grafo_nodos.json` con los nombres y tipos de los nodos y
+    `{prefijo}_grafo_csr.npz` con indptr, indices y pesos. Los vecinos de cada
+    nodo se guardan ordenados por peso descendente, así los términos más
+    relacionados son simplemente los primeros de su fila.
+    """
+    nodos = list(G.nodes())
+    posicion = {nodo: i for i, nodo in enumerate(nodos)}
+    indptr = [0]
+    indices = []
+    pesos = []
+    for nodo in nodos:
+        vecinos = sorted(G[nodo].items(), key=lambda item: item[1].get('weight', 1), reverse=True)
+        indices.extend(posicion[vecino] for vecino, _ in vecinos)
+        pesos.extend(atributos.get('weight', 1) for _, atributos in vecinos)
+        indptr.append(len(indices))
+
+    with open(f"{prefijo}_grafo_nodos.json", 'w', encoding='utf-8') as f:
+        json.dump({
+            "nodos": nodos,
+            "tipos": [G.nodes[nodo].get('tipo', 'termino') for nodo in nodos]
+        }, f, ensure_ascii=False)
+    np.savez_compressed(
+        f"{prefijo}_grafo_csr.npz",
+        indptr=np.array(indptr, dtype=np.int64),
+        indices=np.array(indices, dtype=np.int32),
+        pesos=np.array(pesos, dtype=np.float32)
+    )
+    print(f"Grafo exportado en formato CSR con prefijo '{prefijo}'")
 
 
 # Función para generar diccionario semántico
@@ -319,45 +567,54 @@ def generar_diccionario_semantico(acronimos, terminos, relaciones, G):
 
 
 # Guardar resultados
-def guardar_resultados(diccionario, G, prefijo="resultados"):
+def guardar_resultados(diccionario, G, prefijo="resultados", graphml=False):
     """Guarda el diccionario semántico y el grafo en archivos."""
     # Guardar diccionario como JSON
     with open(f"{prefijo}_diccionario.json", 'w', encoding='utf-8') as f:
         json.dump(diccionario, f, ensure_ascii=False, indent=2)
 
-    # Guardar grafo como GraphML
-    nx.write_graphml(G, f"{prefijo}_grafo.graphml")
+    # Guardar grafo en formato compacto (y como GraphML solo si se pide: es mucho más grande)
+    exportar_grafo_compacto(G, prefijo)
+    if graphml:
+        nx.write_graphml(G, f"{prefijo}_grafo.graphml")
 
     print(f"Resultados guardados con prefijo '{prefijo}'")
 
 
 # Ejecución principal
-def main():
-    # Leer archivos markdown
-    contenido_archivos = leer_archivos_markdown()
+def main(completo=False, prefijo="resultados", render="topk", top_k=150, graphml=False, progreso=None):
+    ruta_estado = f"{prefijo}_estado.json"
 
-    if not contenido_archivos:
+    # Listar archivos markdown (cada worker lee los suyos)
+    archivos = listar_archivos_markdown()
+
+    if not archivos:
         print("No se encontraron archivos para procesar.")
         return
+    print(f"Se encontraron {len(archivos)} archivos markdown.")
+
+    # Descargar una sola vez, antes de repartir el trabajo entre procesos
+    asegurar_recursos_nltk()
 
-    # Extraer acrónimos y términos
-    acronimos = extraer_acronimos(contenido_archivos)
-    terminos = extraer_terminos(contenido_archivos)
+    # Analizar solo los archivos nuevos o modificados (todos con --completo)
+    estado = {"archivos": {}} if completo else cargar_estado(ruta_estado)
+    actualizar_estado(estado, archivos, progreso=progreso)
+    guardar_estado(estado, ruta_estado)
 
-    # Crear relaciones
-    relaciones = crear_relaciones(acronimos, terminos, contenido_archivos)
+    # Combinar las aportaciones por archivo en acrónimos, términos y relaciones
+    acronimos, terminos, relaciones = combinar_estado(estado)
 
     # Crear grafo de conocimiento
     G = crear_grafo(acronimos, terminos, relaciones)
 
-    # Visualizar grafo
-    visualizar_grafo(G)
+    # Visualizar grafo (submuestreado salvo que se pida el completo)
+    visualizar_grafo(G, modo=render, k=top_k)
 
     # Generar diccionario semántico
     diccionario = generar_diccionario_semantico(acronimos, terminos, relaciones, G)
 
     # Guardar resultados
-    guardar_resultados(diccionario, G)
+    guardar_resultados(diccionario, G, prefijo, graphml=graphml)
 
     # Mostrar estadísticas
     print("\n=== Estadísticas ===")
@@ -368,5 +625,12 @@ def main():
     print(f"Aristas en el grafo: {G.number_of_edges()}")
 
 
-# Ejecutar
-main()
\ No newline at end of file
+# Ejecutar (la guarda es necesaria para que los workers puedan importar el módulo)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diccionario semántico y grafo de conocimiento")
+    parser.add_argument("--completo", action="store_true", help="Reanalizar todos los archivos")
+    parser.add_argument("--render", choices=MODOS_RENDER, default="topk", help="Qué parte del grafo dibujar")
+    parser.add_argument("--top-k", type=int, default=150, help="Número de nodos a dibujar")
+    parser.add_argument("--graphml", action="store_true", help="Exportar también en GraphML")
+    args = parser.parse_args()
+    main(completo=args.completo, render=args.render, top_k=args.top_k, graphml=args.graphml)
\ No newline at end of file
@@ -0,0 +1,279 @@
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+HEADING_RE = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+TABLE_RE = re.compile(r"^\s*\|")
+# Línea separadora de la cabecera de una tabla, con o sin barras en los extremos
+# (html2text, que usa el scrapper, escribe `a| b` / `---|---` / `1| 2`)
+TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)+\|?\s*$")
+UNESCAPED_PIPE_RE = re.compile(r"(?<!\\)\|")
+LIST_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+
+
+@dataclass
+class Chunk:
+    """ Fragmento de un documento con su posición exacta en el texto original """
+    text: str
+    start_char: int
+    end_char: int
+    start_line: int
+    end_line: int
+    section_path: tuple = ()
+
+
+@dataclass
+class _Block:
+    start: int
+    end: int
+    kind: str
+    level: int = 0
+    path: tuple = field(default=())
+
+
+class LineIndex:
+    """ Tabla de desplazamientos de inicio de línea para convertir offsets en números de línea """
+
+    def __init__(self, text):
+        self.line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+
+    def line_of(self, offset):
+        """ Número de línea (empezando en 1) del carácter en `offset` """
+        return bisect_right(self.line_starts, offset)
+
+
+def _classify(line):
+    if not line.strip():
+        return "blank"
+    if HEADING_RE.match(line):
+        return "heading"
+    if TABLE_RE.match(line):
+        return "table"
+    if LIST_RE.match(line):
+        return "list"
+    return "text"
+
+
+def _table_lines(text, starts):
+    """
+    Índices de las líneas que forman tablas sin barra inicial: la cabecera, la
+    línea separadora y las filas seguidas que contienen una barra sin escapar.
+    """
+    lines = [text[start:(starts[i + 1] - 1 if i + 1 < len(starts) else len(text))] for i, start in enumerate(starts)]
+    table = set()
+    for i, line in enumerate(lines):
+        if not TABLE_SEPARATOR_RE.match(line) or i == 0 or not UNESCAPED_PIPE_RE.search(lines[i - 1]):
+            continue
+        table.update((i - 1, i))
+        j = i + 1
+        while j < len(lines) and lines[j].strip() and UNESCAPED_PIPE_RE.search(lines[j]):
+            table.add(j)
+            j += 1
+    return table
+
+
+def _scan_blocks(text, line_index):
+    """
+    Recorrer el texto una sola vez y agruparlo en bloques markdown: títulos,
+    tablas, listas y párrafos. Cada bloque guarda sus offsets de inicio y fin
+    y la ruta de títulos (breadcrumb) de la sección en la que se encuentra.
+    """
+    blocks = []
+    current = None
+    headings = []  # Pila de (nivel, título) de la sección actual
+    starts = line_index.line_starts
+    table_lines = _table_lines(text, starts)
+
+    for i, line_start in enumerate(starts):
+        line_end = starts[i + 1] - 1 if i + 1 < len(starts) else len(text)
+        kind = "table" if i in table_lines else _classify(text[line_start:line_end])
+
+        if kind == "blank":
+            current = None
+            continue
+
+        # Las líneas de continuación de una lista pertenecen al mismo elemento
+        if current is not None and current.kind == "list" and kind == "text":
+            kind = "list"
+
+        if kind == "heading":
+            match = HEADING_RE.match(text[line_start:line_end])
+            level = len(match.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, match.group(2)))
+            current = _Block(line_start, line_end, kind, level=level)
+            current.path = tuple(title for _, title in headings)
+            blocks.append(current)
+        elif current is None or current.kind == "heading" or kind != current.kind:
+            current = _Block(line_start, line_end, kind, path=tuple(title for _, title in headings))
+            blocks.append(current)
+        else:
+            current.end = line_end
+
+    return blocks
+
+
+def _split_block(text, block, chunk_size, overlap):
+    """
+    Dividir un bloque mayor que `chunk_size`. Las tablas se cortan solo entre
+    filas; el resto, por líneas o, si no hay, por espacios en blanco.
+    """
+    spans = []
+    start = block.start
+    # La sangría inicial no cuenta: un corte en ella dejaría un fragmento vacío
+    while start < block.end and text[start].isspace():
+        start += 1
+    while start < block.end:
+        limit = start + chunk_size
+        if limit >= block.end:
+            spans.append((start, block.end, block.path))
+            break
+
+        # Cortar por línea solo si el fragmento resultante no queda demasiado corto
+        cut = text.rfind("\n", start + chunk_size // 2, limit + 1)
+        at_line = cut != -1
+        if not at_line and block.kind == "table":
+            cut = text.rfind("\n", start + 1, limit + 1)
+            if cut == -1:
+                # Una fila más larga que chunk_size se emite entera
+                cut = text.find("\n", limit, block.end)
+                cut = block.end if cut == -1 else cut
+            at_line = True
+        elif not at_line:
+            cut = max(text.rfind(" ", start + 1, limit + 1), text.rfind("\t", start + 1, limit + 1))
+            if cut == -1:
+                cut = limit
+        # Solo se salta el carácter del corte si es un salto de línea o un espacio
+        on_space = at_line or text[cut].isspace()
+
+        end = cut
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            spans.append((start, end, block.path))
+
+        if at_line or overlap <= 0:
+            next_start = cut + 1 if on_space else cut
+        else:
+            # Retroceder `overlap` caracteres y avanzar hasta el siguiente límite de palabra
+            back = max(cut - overlap, start + 1)
+            boundary = re.search(r"\s", text[back:cut])
+            if boundary:
+                next_start = back + boundary.end()
+            else:
+                # Palabra más larga que el solapamiento (URLs, tokens): se solapa a mitad de palabra
+                next_start = cut + 1 if on_space else back
+
+        # Saltar los espacios iniciales del siguiente fragmento
+        while next_start < block.end and text[next_start].isspace():
+            next_start += 1
+        start = next_start
+
+    return spans
+
+
+def _pack(blocks, text, chunk_size, overlap, section_level):
+    """
+    Agrupar bloques consecutivos en spans de hasta `chunk_size` caracteres con
+    solapamiento. Un título de nivel `section_level` o superior siempre abre un
+    fragmento nuevo, de modo que ningún fragmento mezcla secciones distintas.
+    """
+    spans = []
+    current = []
+
+    def flush():
+        """ Emitir el span actual y devolver (bloques de solapamiento, títulos pendientes) """
+        # Un título al final del fragmento pertenece al contenido que le sigue
+        headings = []
+        while current and current[-1].kind == "heading":
+            headings.insert(0, current.pop())
+        if not current:
+            return [], headings
+        spans.append((current[0].start, current[-1].end, current[0].path))
+
+        carry = []
+        if overlap > 0:
+            for block in reversed(current[1:]):
+                if current[-1].end - block.start > overlap:
+                    break
+                carry.insert(0, block)
+        return carry, headings
+
+    for block in blocks:
+        if block.kind == "heading" and block.level <= section_level and current:
+            # El solapamiento no cruza los límites de sección
+            _, headings = flush()
+            current = headings
+
+        if block.end - block.start > chunk_size:
+            _, headings = flush()
+            start = headings[0].start if headings else block.start
+            path = headings[0].path if headings else block.path
+            spans.extend(_split_block(text, _Block(start, block.end, block.kind, path=path), chunk_size, overlap))
+            current = []
+            continue
+
+        if current and block.end - current[0].start > chunk_size:
+            carry, headings = flush()
+            # El solapamiento se descarta si no deja sitio para los títulos y el bloque nuevo
+            first = headings[0].start if headings else block.start
+            while carry and block.end - min(carry[0].start, first) > chunk_size:
+                carry.pop(0)
+            current = carry + headings
+
+        current.append(block)
+
+    if current:
+        _, headings = flush()
+        if headings:
+            spans.append((headings[0].start, headings[-1].end, headings[0].path))
+    return spans
+
+
+def chunk_markdown(text, chunk_size=500, overlap=50, section_level=2):
+    """
+    Dividir un documento markdown en fragmentos de hasta `chunk_size` caracteres
+    respetando su estructura (títulos, listas y tablas), con solapamiento de
+    hasta `overlap` caracteres entre fragmentos consecutivos. Los títulos de
+    nivel `section_level` o superior (p. ej. "## Página N") abren siempre un
+    fragmento nuevo y las tablas nunca se cortan a mitad de fila.
+
+    Cada fragmento lleva en `section_path` la ruta de títulos de su sección.
+
+    El recorrido es lineal en el tamaño del texto y cada fragmento es un corte
+    exacto del original, por lo que sus offsets de carácter y de línea son
+    siempre correctos aunque el mismo texto aparezca varias veces.
+
+    Returns:
+        list[Chunk]: Fragmentos en orden de aparición
+    """
+    line_index = LineIndex(text)
+    blocks = _scan_blocks(text, line_index)
+    chunks = []
+    for start, end, path in _pack(blocks, text, chunk_size, overlap, section_level):
+        chunks.append(Chunk(
+            text=text[start:end],
+            start_char=start,
+            end_char=end,
+            start_line=line_index.line_of(start),
+            end_line=line_index.line_of(max(end - 1, start)),
+            section_path=path
+        ))
+    return chunks
+
+
+def chunk_metadata(chunk):
+    """
+    Metadatos de posición y sección de un fragmento para ChromaDB, que solo
+    admite valores escalares: la ruta se guarda unida por " > " y su primer
+    nivel por separado para poder filtrar por él.
+    """
+    return {
+        "section": " > ".join(chunk.section_path),
+        "section_top": chunk.section_path[0] if chunk.section_path else "",
+        "start_line": chunk.start_line,
+        "end_line": chunk.end_line,
+        "start_char": chunk.start_char,
+        "end_char": chunk.end_char
+    }
@@ -1,141 +1,91 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
 import glob
+from dedupe import deduplicate_chunks
+from index_versions import create_version, garbage_collect, publish, resolve
+from markdown_chunker import chunk_markdown, chunk_metadata
 
-# Crear un cliente de ChromaDB
-client = chromadb.PersistentClient(path="./chroma_db")
+CHROMA_PATH = "./chroma_db"
+COLLECTION_NAME = "markdown_documents"
+MARKDOWN_DIR = "markdown_pages"
 
-# Eliminar colección existente si existe
-try:
-    client.delete_collection("markdown_documents")
-except Exception as e:
-    print(f"Info: {str(e)}")
 
-# Crear una colección para los documentos markdown
-collection = client.create_collection(
-    name="markdown_documents",
-    metadata={"hnsw:space": "cosine"}
-)
+def get_client(chroma_path=CHROMA_PATH):
+    import chromadb
+
+    # Crear un cliente de ChromaDB
+    return chromadb.PersistentClient(path=chroma_path)
+
+
+def get_collection(chroma_path=CHROMA_PATH):
+    """ Abrir la versión activa de la colección de documentos markdown """
+    path, _ = resolve(chroma_path, COLLECTION_NAME)
+    return get_client(path).get_collection(name=COLLECTION_NAME)
+
 
 def read_markdown_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def split_into_chunks(text, chunk_size=500, overlap=50):
+
+def build_documents(markdown_dir=MARKDOWN_DIR):
     """
-    Divide el texto en chunks más pequeños con superposición.
-    
-    Args:
-        text (str): Texto a dividir
-        chunk_size (int): Tamaño aproximado de cada chunk en caracteres
-        overlap (int): Número de caracteres de superposición entre chunks
-        
+    Dividir todos los archivos markdown en fragmentos y descartar los casi duplicados.
+
     Returns:
-        list: Lista de chunks de texto
+        tuple: (documentos, metadatos, ids, número de archivos)
     """
-    # Dividir el texto en párrafos
-    paragraphs = text.split('\n\n')
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for paragraph in paragraphs:
-        paragraph = paragraph.strip()
-        if not paragraph:
-            continue
-            
-        # Si el párrafo es más grande que chunk_size, dividirlo
-        if len(paragraph) > chunk_size:
-            words = paragraph.split()
-            current_paragraph = []
-            current_paragraph_size = 0
-            
-            for word in words:
-                if current_paragraph_size + len(word) + 1 <= chunk_size:
-                    current_paragraph.append(word)
-                    current_paragraph_size += len(word) + 1
-                else:
-                    chunks.append(' '.join(current_paragraph))
-                    current_paragraph = [word]
-                    current_paragraph_size = len(word)
-            
-            if current_paragraph:
-                chunks.append(' '.join(current_paragraph))
-        else:
-            # Si añadir el párrafo excede chunk_size, crear nuevo chunk
-            if current_size + len(paragraph) > chunk_size:
-                chunks.append('\n\n'.join(current_chunk))
-                # Mantener el último párrafo para overlap
-                if current_chunk and overlap > 0:
-                    current_chunk = [current_chunk[-1]]
-                    current_size = len(current_chunk[-1])
-                else:
-                    current_chunk = []
-                    current_size = 0
-            
-            current_chunk.append(paragraph)
-            current_size += len(paragraph)
-    
-    # Añadir el último chunk si existe
-    if current_chunk:
-        chunks.append('\n\n'.join(current_chunk))
-    
-    return chunks
-
-def get_chunk_position(text, chunk):
+    # Obtener todos los archivos markdown
+    markdown_files = glob.glob(os.path.join(markdown_dir, "**/*.md"), recursive=True)
+
+    # Preparar los documentos para la indexación
+    documents = []
+    metadatas = []
+    ids = []
+    doc_counter = 0
+
+    for file_path in markdown_files:
+        content = read_markdown_file(file_path)
+        relative_path = os.path.relpath(file_path, markdown_dir)
+
+        # Dividir el contenido en chunks (con sus posiciones exactas en el archivo)
+        chunks = chunk_markdown(content, chunk_size=500, overlap=50)
+
+        for i, chunk in enumerate(chunks):
+            documents.append(chunk.text)
+            metadatas.append({
+                "path": relative_path,
+                "filename": os.path.basename(file_path),
+                "chunk_index": i,
+                "total_chunks": len(chunks),
+                **chunk_metadata(chunk)
+            })
+            ids.append(f"doc_{doc_counter}_chunk_{i}")
+
+        doc_counter += 1
+
+    # Indexar un solo representante de cada grupo de fragmentos casi idénticos
+    if documents:
+        kept, metadatas = deduplicate_chunks(documents, metadatas, source_key="path")
+        documents = [documents[i] for i in kept]
+        ids = [ids[i] for i in kept]
+
+    return documents, metadatas, ids, doc_counter
+
+
+def index_markdown(markdown_dir=MARKDOWN_DIR, chroma_path=CHROMA_PATH):
     """
-    Obtiene la posición aproximada del chunk en el texto original.
-    
-    Returns:
-        tuple: (número de línea inicial, número de línea final)
+    Indexar los fragmentos de todos los archivos markdown en una versión nueva
+    de la colección. La versión activa sigue respondiendo consultas hasta que la
+    nueva está completa y supera una búsqueda de prueba; entonces se cambia el
+    alias y las versiones retiradas se eliminan pasado el periodo de gracia.
     """
-    text_lines = text.split('\n')
-    chunk_start = text.find(chunk)
-    if chunk_start == -1:
-        return (0, 0)
-    
-    # Contar líneas hasta el inicio del chunk
-    start_line = text[:chunk_start].count('\n') + 1
-    end_line = start_line + chunk.count('\n')
-    
-    return (start_line, end_line)
-
-# Obtener todos los archivos markdown
-markdown_dir = "markdown_pages"
-markdown_files = glob.glob(os.path.join(markdown_dir, "**/*.md"), recursive=True)
-
-# Preparar los documentos para la indexación
-documents = []
-metadatas = []
-ids = []
-doc_counter = 0
-
-for file_path in markdown_files:
-    content = read_markdown_file(file_path)
-    relative_path = os.path.relpath(file_path, markdown_dir)
-    
-    # Dividir el contenido en chunks
-    chunks = split_into_chunks(content)
-    
-    for i, chunk in enumerate(chunks):
-        start_line, end_line = get_chunk_position(content, chunk)
-        
-        documents.append(chunk)
-        metadatas.append({
-            "path": relative_path,
-            "filename": os.path.basename(file_path),
-            "chunk_index": i,
-            "total_chunks": len(chunks),
-            "start_line": start_line,
-            "end_line": end_line
-        })
-        ids.append(f"doc_{doc_counter}_chunk_{i}")
-    
-    doc_counter += 1
-
-# Añadir documentos a la colección
-if documents:
+    documents, metadatas, ids, doc_counter = build_documents(markdown_dir)
+    if not documents:
+        print("No markdown files found to index")
+        return None
+
+    name, _, collection = create_version(chroma_path, COLLECTION_NAME, metadata={"hnsw:space": "cosine"})
+
     # Añadir documentos en lotes de 100
     batch_size = 100
     for i in range(0, len(documents), batch_size):
@@ -146,37 +96,45 @@ if documents:
             ids=ids[i:end_idx]
         )
     print(f"Indexed {len(documents)} chunks from {doc_counter} markdown files")
-else:
-    print("No markdown files found to index")
 
-def search_documents(query, n_results=5):
+    publish(chroma_path, COLLECTION_NAME, name, query_text="¿Qué es la FIB?")
+    garbage_collect(chroma_path, COLLECTION_NAME)
+    return collection
+
+
+def search_documents(query, n_results=5, collection=None):
     """
     Busca documentos relacionados con la consulta.
-    
+
     Args:
         query (str): La consulta de búsqueda
         n_results (int): Número de resultados a devolver
-        
+        collection: Colección en la que buscar (por defecto, la de CHROMA_PATH)
+
     Returns:
         list: Lista de resultados con el contenido y metadata
     """
+    collection = collection or get_collection()
     results = collection.query(
         query_texts=[query],
         n_results=n_results,
         include=["documents", "metadatas", "distances"]
     )
-    
+
     return results
 
+
 # Ejemplo de uso
 if __name__ == "__main__":
+    collection = index_markdown() or get_collection()
+
     # Ejemplo de búsqueda
     query = "¿Qué es la FIB?"
-    results = search_documents(query)
-    
+    results = search_documents(query, collection=collection)
+
     print(f"\nResultados para la búsqueda: '{query}'")
     print("-" * 50)
-    
+
     for i, (doc, metadata, distance) in enumerate(zip(
         results['documents'][0],
         results['metadatas'][0],
@@ -185,6 +143,7 @@ if __name__ == "__main__":
         print(f"\nResultado {i+1}:")
         print(f"Archivo: {metadata['filename']}")
         print(f"Ruta: {metadata['path']}")
+        print(f"Sección: {metadata['section']}")
         print(f"Líneas: {metadata['start_line']} - {metadata['end_line']}")
         print(f"Chunk: {metadata['chunk_index'] + 1} de {metadata['total_chunks']}")
         print(f"Relevancia: {1 - distance:.2%}")
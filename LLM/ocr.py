@@ -8,22 +8,36 @@ import tempfile
 from pathlib import Path
 from urllib.parse import urlparse
 import logging
-from pdf2image import convert_from_path, convert_from_bytes
-import pytesseract
-import cv2
 import numpy as np
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Set Tesseract executable path explicitly
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Tesseract executable path
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+# OCR dependencies are heavy (OpenCV alone takes hundreds of ms to import),
+# so they are loaded when the first converter is created, not on import
+cv2 = None
+pytesseract = None
+convert_from_path = None
+
+
+def load_ocr_dependencies():
+    """Import pdf2image, pytesseract and OpenCV once and configure Tesseract."""
+    global cv2, pytesseract, convert_from_path
+    if cv2 is None:
+        import cv2 as _cv2
+        import pytesseract as _pytesseract
+        from pdf2image import convert_from_path as _convert_from_path
+
+        _pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        cv2, pytesseract, convert_from_path = _cv2, _pytesseract, _convert_from_path
 
 class PdfOcrConverter:
     def __init__(self, output_dir="markdown_pages/pdf"):
         """Initialize the PDF OCR converter with the output directory."""
         self.output_dir = output_dir
+        load_ocr_dependencies()
         
         # Create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
@@ -260,6 +274,8 @@ def process_pdf_folder(input_folder, output_dir='markdown_pages/pdf'):
 
 # Example usage
 if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     input_folder = "./pdf_pages"  # Change this to your input folder path
     output_folder = "./pdfoutput"  # Change this to your output folder path
     result = process_pdf_folder(input_folder, output_folder)
@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import shutil
+import signal
+import sys
+import time
+import uuid
+from datetime import datetime
+
+RUNS_DIR = "./runs"
+INDEXES_DIR = "./indexes"
+CHROMA_PATH = "./chroma_db"
+COLLECTION_NAME = "markdown_docs"
+
+STAGES = ["scrape", "ocr", "index", "analyze", "dictionary"]
+
+# Estados de una ejecución y de cada etapa
+PENDING, RUNNING, SUCCEEDED, FAILED, CANCELLED = "pending", "running", "succeeded", "failed", "cancelled"
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _now():
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+def write_json_atomic(path, data):
+    """ Escribir un JSON de forma atómica: quien lo lea nunca ve un archivo a medias """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def new_run(stages=None, runs_dir=RUNS_DIR):
+    """ Crear el directorio y el estado inicial de una ejecución """
+    stages = stages or STAGES
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(f"Etapas desconocidas: {', '.join(unknown)}")
+    if "dictionary" in stages and "index" not in stages:
+        raise ValueError("La etapa dictionary se construye en la versión del índice: incluye también la etapa index")
+
+    run_id = f"{datetime.utcnow():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+    run_dir = os.path.join(runs_dir, run_id)
+    os.makedirs(run_dir)
+    state = {
+        "id": run_id,
+        "status": PENDING,
+        "created_at": _now(),
+        "started_at": None,
+        "finished_at": None,
+        "pid": None,
+        "index_dir": os.path.join(INDEXES_DIR, run_id),
+        "stages": [
+            {"name": stage, "status": PENDING, "started_at": None, "duration_s": None,
+             "items": None, "items_per_s": None, "progress": None, "error": None}
+            for stage in STAGES if stage in stages
+        ]
+    }
+    write_json_atomic(os.path.join(run_dir, "state.json"), state)
+    return state
+
+
+def load_run(run_id, runs_dir=RUNS_DIR):
+    return read_json(os.path.join(runs_dir, run_id, "state.json"))
+
+
+def list_runs(runs_dir=RUNS_DIR):
+    """ Estados de todas las ejecuciones, de la más reciente a la más antigua """
+    if not os.path.isdir(runs_dir):
+        return []
+    runs = []
+    for run_id in sorted(os.listdir(runs_dir), reverse=True):
+        path = os.path.join(runs_dir, run_id, "state.json")
+        if os.path.exists(path):
+            runs.append(read_json(path))
+    return runs
+
+
+def request_cancel(run_id, runs_dir=RUNS_DIR):
+    """
+    Pedir la cancelación: el runner la atiende entre etapas o al informar de su
+    progreso. No envía señales: quien lanza el runner (app/services/ingestion_service.py)
+    sabe si su proceso sigue vivo y le envía SIGTERM para interrumpir una etapa larga.
+    """
+    state = load_run(run_id, runs_dir)
+    if state["status"] in (PENDING, RUNNING):
+        open(os.path.join(runs_dir, run_id, "cancel"), "w").close()
+    return state
+
+
+class RunContext:
+    """ Estado de la ejecución en curso, compartido con las etapas """
+
+    def __init__(self, state, runs_dir=RUNS_DIR):
+        self.state = state
+        self.run_dir = os.path.join(runs_dir, state["id"])
+        self.index_dir = state["index_dir"]
+        self.stage = None
+        self._last_save = 0.0
+
+    def save(self):
+        write_json_atomic(os.path.join(self.run_dir, "state.json"), self.state)
+        self._last_save = time.monotonic()
+
+    def check_cancelled(self):
+        if os.path.exists(os.path.join(self.run_dir, "cancel")):
+            raise Cancelled()
+
+    def progress(self, done, total=None):
+        """ Informar del avance de la etapa actual (se guarda como mucho una vez por segundo) """
+        self.check_cancelled()
+        self.stage["progress"] = {"done": done, "total": total}
+        if time.monotonic() - self._last_save >= 1.0:
+            self.save()
+
+
+# ==============================
+# Etapas (los scripts se importan al ejecutarse la etapa)
+# ==============================
+def stage_scrape(ctx):
+    import scrapper
+
+    scrapper.main()
+    return sum(1 for _ in scrapper.iter_saved_pages())
+
+
+def stage_ocr(ctx):
+    import ocr
+
+    pdf_folder = "./pdf_pages"
+    if not os.path.isdir(pdf_folder):
+        return 0
+    pdf_files = [f for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf")]
+    converter = ocr.PdfOcrConverter(output_dir="markdown_pages/pdf")
+    for i, pdf_file in enumerate(pdf_files):
+        ctx.progress(i, len(pdf_files))
+        try:
+            converter.process_pdf(os.path.join(pdf_folder, pdf_file))
+        except Exception as e:
+            print(f"Error converting '{pdf_file}': {e}")
+    return len(pdf_files)
+
+
+def stage_index(ctx):
+    import chunks
+    from dedupe import deduplicate_chunks
+
+    documents = chunks.load_markdown_files("./markdown_pages")
+    texts, metadatas = chunks.chunk_texts(documents)
+    kept, metadatas = deduplicate_chunks(texts, metadatas)
+    texts = [texts[i] for i in kept]
+    ctx.progress(0, len(texts))
+
+    embeddings, _ = chunks.compute_embeddings(texts)
+    ctx.check_cancelled()
+    # Versión nueva en su propio directorio, sin publicar: se activa al terminar
+    # todas las etapas. Al reanudar, la versión a medias se construye de nuevo
+    ctx.state["index_version"] = chunks.store_in_chromadb(
+        texts, embeddings, metadatas,
+        chroma_path=CHROMA_PATH,
+        collection_name=COLLECTION_NAME,
+        progress=ctx.progress,
+        version=ctx.state["id"],
+        publish_version=False
+    )
+    return len(texts)
+
+
+def stage_analyze(ctx):
+    import markdown_analyzer
+
+    archivos = markdown_analyzer.listar_archivos_markdown()
+    markdown_analyzer.main(render="ninguno", progreso=ctx.progress)
+    # El diccionario servido es una copia: el análisis incremental sigue usando el de trabajo
+    os.makedirs(ctx.index_dir, exist_ok=True)
+    for suffix in ("_diccionario.json", "_grafo_nodos.json", "_grafo_csr.npz"):
+        if os.path.exists(f"resultados{suffix}"):
+            shutil.copy2(f"resultados{suffix}", os.path.join(ctx.index_dir, f"resultados{suffix}"))
+    return len(archivos)
+
+
+def stage_dictionary(ctx):
+    import prepareEmbeddingsForDictionary
+    from index_versions import resolve, version_path
+
+    # La colección del diccionario se construye dentro de la versión nueva del
+    # índice y se publica con ella; de la versión activa solo se leen los
+    # embeddings exportados, sin abrir su almacén
+    name = ctx.state.get("index_version")
+    if name is None:
+        raise ValueError("No hay una versión nueva del índice en la que construir el diccionario")
+    published_path, _ = resolve(CHROMA_PATH, COLLECTION_NAME)
+    result = prepareEmbeddingsForDictionary.main(
+        chroma_path=version_path(CHROMA_PATH, name),
+        embeddings_previos=os.path.join(published_path, prepareEmbeddingsForDictionary.ARCHIVO_EMBEDDINGS)
+    )
+    return result["actualizados"] + result["sin_cambios"]
+
+
+STAGE_FUNCTIONS = {
+    "scrape": stage_scrape,
+    "ocr": stage_ocr,
+    "index": stage_index,
+    "analyze": stage_analyze,
+    "dictionary": stage_dictionary,
+}
+
+
+def publish_index(ctx):
+    """
+    Cambiar el alias de la colección a la versión construida en esta ejecución
+    (tras una consulta de prueba), con su colección del diccionario, y eliminar
+    las versiones caducadas.
+    """
+    from index_versions import garbage_collect, publish
+
+    # Sin la etapa de indexación no hay una versión nueva que publicar
+    name = ctx.state.get("index_version")
+    if name is None:
+        return None
+    entry = publish(CHROMA_PATH, COLLECTION_NAME, name, metadata={
+        "run_id": ctx.state["id"],
+        "dictionary_prefix": os.path.abspath(os.path.join(ctx.index_dir, "resultados"))
+    })
+    garbage_collect(CHROMA_PATH, COLLECTION_NAME)
+    return {"collection": name, "published_at": entry["published_at"]}
+
+
+def run(run_id, runs_dir=RUNS_DIR):
+    """
+    Ejecutar (o reanudar) las etapas pendientes de una ejecución en orden.
+
+    Las etapas ya terminadas con éxito se saltan, así que una ejecución fallida
+    o cancelada se puede reanudar. Cada etapa guarda su duración, el número de
+    elementos procesados y su throughput. Solo si todas terminan bien se
+    publica el índice nuevo; mientras tanto el servicio sigue usando el anterior.
+    """
+    ctx = RunContext(load_run(run_id, runs_dir), runs_dir)
+    state = ctx.state
+    cancel_path = os.path.join(ctx.run_dir, "cancel")
+    if os.path.exists(cancel_path):
+        os.remove(cancel_path)
+
+    def on_sigterm(signum, frame):
+        raise Cancelled()
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    state.update(status=RUNNING, pid=os.getpid(), started_at=state["started_at"] or _now(), finished_at=None)
+    ctx.save()
+
+    try:
+        for stage in state["stages"]:
+            if stage["status"] == SUCCEEDED:
+                continue
+            ctx.check_cancelled()
+            ctx.stage = stage
+            stage.update(status=RUNNING, started_at=_now(), error=None, progress=None)
+            ctx.save()
+            print(f"▶️ Etapa {stage['name']}")
+
+            start = time.perf_counter()
+            items = STAGE_FUNCTIONS[stage["name"]](ctx)
+            duration = time.perf_counter() - start
+
+            stage.update(
+                status=SUCCEEDED,
+                duration_s=round(duration, 3),
+                items=items,
+                items_per_s=round(items / duration, 3) if items and duration > 0 else None
+            )
+            ctx.save()
+            print(f"✅ Etapa {stage['name']}: {items} elementos en {duration:.1f} s")
+
+        state["index"] = publish_index(ctx)
+        state["status"] = SUCCEEDED
+    except (Cancelled, KeyboardInterrupt):
+        state["status"] = CANCELLED
+        if ctx.stage is not None and ctx.stage["status"] == RUNNING:
+            ctx.stage["status"] = CANCELLED
+        print("⏹️ Ejecución cancelada")
+    except Exception as e:
+        state["status"] = FAILED
+        if ctx.stage is not None:
+            ctx.stage.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+        print(f"❌ Ejecución fallida: {e}")
+    finally:
+        state.update(pid=None, finished_at=_now())
+        ctx.save()
+
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline de ingesta: scrape → ocr → index → analyze → dictionary")
+    parser.add_argument("--run-id", help="Reanudar (o ejecutar) una ejecución ya creada")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, help="Etapas a ejecutar (por defecto, todas)")
+    args = parser.parse_args()
+
+    run_id = args.run_id or new_run(args.stages)["id"]
+    state = run(run_id)
+    sys.exit(0 if state["status"] == SUCCEEDED else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
-﻿# Ejemplo de uso con embeddings
+﻿# Preparación e indexación del diccionario semántico con embeddings
+import hashlib
 import json
+import os
 
+COLECCION_DICCIONARIO = "dictionary"
+# Embeddings exportados junto a cada versión para reutilizarlos en la siguiente
+ARCHIVO_EMBEDDINGS = "dictionary_embeddings.npz"
 
-def preparar_para_embeddings(diccionario, archivo_salida="embeddings_data.json"):
-    """Prepara los datos del diccionario semántico para ser usados con embeddings."""
-    datos_embedding = []
 
+def generar_registros(diccionario):
+    """Genera uno a uno los registros para embeddings de los acrónimos y términos del diccionario."""
     # Procesar acrónimos
     for acronimo, info in diccionario["acronimos"].items():
         # Crear texto enriquecido para cada acrónimo
@@ -16,9 +20,9 @@ def preparar_para_embeddings(diccionario, archivo_salida="embeddings_data.json")
         texto += f"\nAPARECE EN: {', '.join(info['archivos'])}"
 
         if info["conexiones"]:
-            texto += f"\nRELACIONADO CON: {', '.join(info['conexiones'])}"
+            texto += f"\nRELACIONADO CON: {', '.join(dict.fromkeys(info['conexiones']))}"
 
-        datos_embedding.append({
+        yield {
             "tipo": "acronimo",
             "id": acronimo,
             "texto": texto,
@@ -27,7 +31,7 @@ def preparar_para_embeddings(diccionario, archivo_salida="embeddings_data.json")
                 "archivos": info["archivos"],
                 "centralidad": info.get("centralidad", 0)
             }
-        })
+        }
 
     # Procesar términos
     for termino, info in diccionario["terminos"].items():
@@ -37,9 +41,9 @@ def preparar_para_embeddings(diccionario, archivo_salida="embeddings_data.json")
         texto += f"\nAPARECE EN: {', '.join(info['archivos'])}"
 
         if info["conexiones"]:
-            texto += f"\nRELACIONADO CON: {', '.join(info['conexiones'])}"
+            texto += f"\nRELACIONADO CON: {', '.join(dict.fromkeys(info['conexiones']))}"
 
-        datos_embedding.append({
+        yield {
             "tipo": "termino",
             "id": termino,
             "texto": texto,
@@ -48,28 +52,186 @@ def preparar_para_embeddings(diccionario, archivo_salida="embeddings_data.json")
                 "archivos": info["archivos"],
                 "centralidad": info.get("centralidad", 0)
             }
-        })
+        }
 
-    # Guardar datos para embeddings
+
+def preparar_para_embeddings(diccionario, archivo_salida="embeddings_data.jsonl"):
+    """Escribe los registros del diccionario en JSONL, uno por línea, sin acumularlos en memoria."""
+    total = 0
     with open(archivo_salida, 'w', encoding='utf-8') as f:
-        json.dump(datos_embedding, f, ensure_ascii=False, indent=2)
+        for registro in generar_registros(diccionario):
+            f.write(json.dumps(registro, ensure_ascii=False))
+            f.write("\n")
+            total += 1
 
     print(f"Datos para embeddings guardados en {archivo_salida}")
-    print(f"Total de elementos para embeddings: {len(datos_embedding)}")
-
-    return datos_embedding
-
-
-# Preparar datos para embeddings
-with open("resultados_diccionario.json", 'r', encoding='utf-8') as f:
-    diccionario_cargado = json.load(f)
-
-datos_para_embeddings = preparar_para_embeddings(diccionario_cargado)
-
-# Ejemplo de cómo podrías usar estos datos con un sistema de embeddings
-print("\n=== Ejemplo de uso con embeddings ===")
-print("Para utilizar estos datos con un sistema de embeddings, puedes:")
-print("1. Cargar el archivo embeddings_data.json")
-print("2. Generar embeddings para cada elemento usando su campo 'texto'")
-print("3. Almacenar los embeddings junto con los metadatos")
-print("4. Usar estos embeddings para búsqueda semántica o recomendaciones")
\ No newline at end of file
+    print(f"Total de elementos para embeddings: {total}")
+    return total
+
+
+def leer_registros(archivo="embeddings_data.jsonl"):
+    """Lee los registros del archivo JSONL de uno en uno."""
+    with open(archivo, 'r', encoding='utf-8') as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def en_lotes(registros, tamano):
+    """Agrupa un iterable en listas de hasta `tamano` elementos."""
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def id_estable(registro):
+    """Identificador del registro en la colección, estable entre ejecuciones."""
+    return f"{registro['tipo']}:{registro['id']}"
+
+
+def huella_texto(texto):
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def metadatos_chroma(registro, huella):
+    """Metadatos escalares (ChromaDB no admite listas ni None)."""
+    metadata = registro["metadata"]
+    return {
+        "tipo": registro["tipo"],
+        "nombre": registro["id"],
+        "definicion": metadata.get("definicion") or "",
+        "ocurrencias": metadata.get("ocurrencias", 0),
+        "archivos": "|".join(metadata.get("archivos", [])),
+        "centralidad": float(metadata.get("centralidad", 0)),
+        "huella": huella
+    }
+
+
+def guardar_embeddings(coleccion, archivo):
+    """Exporta ids, huellas y embeddings de la colección a un archivo .npz."""
+    import numpy as np
+
+    datos = coleccion.get(include=["embeddings", "metadatas"])
+    np.savez(
+        archivo,
+        ids=np.array(datos["ids"], dtype=str),
+        huellas=np.array([(metadata or {}).get("huella", "") for metadata in datos["metadatas"]], dtype=str),
+        embeddings=np.asarray(datos["embeddings"], dtype=np.float32)
+    )
+
+
+def cargar_embeddings(archivo):
+    """Embeddings exportados por `guardar_embeddings`: {id: (huella, embedding)}."""
+    import numpy as np
+
+    if not archivo or not os.path.exists(archivo):
+        return {}
+    datos = np.load(archivo)
+    return {
+        id_: (huella, embedding)
+        for id_, huella, embedding in zip(datos["ids"].tolist(), datos["huellas"].tolist(), datos["embeddings"])
+    }
+
+
+def indexar_registros(registros, modelo, coleccion, tamano_lote=64, previos=None):
+    """
+    Calcula los embeddings de los campos `texto` por lotes y los inserta o
+    actualiza en la colección por id estable. Los registros cuyo texto no ha
+    cambiado desde la última indexación no se vuelven a calcular, y los que ya
+    no están en el diccionario se eliminan.
+
+    Con `previos` ({id: (huella, embedding)}, ver `cargar_embeddings`) la
+    colección puede estar vacía, como en una versión nueva del índice, y se
+    reutilizan los embeddings de la versión anterior cuyo texto no ha cambiado.
+
+    Returns:
+        dict: Número de registros actualizados, sin cambios y eliminados
+    """
+    vistos = set()
+    actualizados = 0
+    sin_cambios = 0
+
+    for lote in en_lotes(registros, tamano_lote):
+        ids = [id_estable(registro) for registro in lote]
+        vistos.update(ids)
+
+        existentes = coleccion.get(ids=ids, include=["metadatas"])
+        huellas_previas = {
+            id_: (metadata or {}).get("huella") for id_, metadata in zip(existentes["ids"], existentes["metadatas"])
+        }
+
+        pendientes = []
+        reutilizados = []
+        for id_, registro in zip(ids, lote):
+            huella = huella_texto(registro["texto"])
+            if huellas_previas.get(id_) == huella:
+                sin_cambios += 1
+            elif previos and previos.get(id_, (None,))[0] == huella:
+                reutilizados.append((id_, registro, huella))
+            else:
+                pendientes.append((id_, registro, huella))
+
+        if reutilizados:
+            coleccion.upsert(
+                ids=[id_ for id_, _, _ in reutilizados],
+                embeddings=[previos[id_][1].tolist() for id_, _, _ in reutilizados],
+                documents=[registro["texto"] for _, registro, _ in reutilizados],
+                metadatas=[metadatos_chroma(registro, huella) for _, registro, huella in reutilizados]
+            )
+            sin_cambios += len(reutilizados)
+
+        if not pendientes:
+            continue
+
+        textos = [registro["texto"] for _, registro, _ in pendientes]
+        embeddings = modelo.encode(textos, batch_size=tamano_lote)
+        coleccion.upsert(
+            ids=[id_ for id_, _, _ in pendientes],
+            embeddings=[embedding.tolist() for embedding in embeddings],
+            documents=textos,
+            metadatas=[metadatos_chroma(registro, huella) for _, registro, huella in pendientes]
+        )
+        actualizados += len(pendientes)
+
+    obsoletos = [id_ for id_ in coleccion.get(include=[])["ids"] if id_ not in vistos]
+    if obsoletos:
+        coleccion.delete(ids=obsoletos)
+
+    return {"actualizados": actualizados, "sin_cambios": sin_cambios, "eliminados": len(obsoletos)}
+
+
+def main(prefijo="resultados", chroma_path="./chroma_db", tamano_lote=64, embeddings_previos=None):
+    """
+    Indexa el diccionario en la colección `dictionary` del almacén `chroma_path`
+    y exporta sus embeddings a `ARCHIVO_EMBEDDINGS` en el mismo directorio.
+    `embeddings_previos` es el archivo exportado por una versión anterior.
+    """
+    import chromadb
+    from embedding_backends import load_backend
+
+    # Preparar datos para embeddings
+    with open(f"{prefijo}_diccionario.json", 'r', encoding='utf-8') as f:
+        diccionario_cargado = json.load(f)
+    archivo_jsonl = f"{prefijo}_embeddings_data.jsonl"
+    preparar_para_embeddings(diccionario_cargado, archivo_jsonl)
+    del diccionario_cargado
+
+    # Indexar en la colección del diccionario
+    modelo = load_backend(model_name=os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2"))
+    coleccion = chromadb.PersistentClient(path=chroma_path).get_or_create_collection(name=COLECCION_DICCIONARIO)
+    resultado = indexar_registros(leer_registros(archivo_jsonl), modelo, coleccion, tamano_lote,
+                                  previos=cargar_embeddings(embeddings_previos))
+    guardar_embeddings(coleccion, os.path.join(chroma_path, ARCHIVO_EMBEDDINGS))
+
+    print(f"Colección '{COLECCION_DICCIONARIO}': {resultado['actualizados']} actualizados, "
+          f"{resultado['sin_cambios']} sin cambios, {resultado['eliminados']} eliminados")
+    return resultado
+
+
+if __name__ == "__main__":
+    main()
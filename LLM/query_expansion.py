@@ -0,0 +1,164 @@
+import json
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Acrónimos que se aceptan también escritos en minúsculas ("tfg"). Solo los de
+# esta lista: palabras comunes como "per", "les" o "del" coinciden en mayúsculas
+# con acrónimos del diccionario y no deben expandirse
+LOWERCASE_ACRONYMS = frozenset({"FIB", "UPC", "TFG", "TFM", "GEI", "MEI", "MIRI", "ECTS", "PFC", "CFIS"})
+
+
+@dataclass
+class ExpandedQuery:
+    """ Pregunta expandida junto con lo que se ha añadido a ella """
+    text: str
+    original: str
+    definitions: dict = field(default_factory=dict)
+    related: list = field(default_factory=list)
+
+    @property
+    def expanded(self):
+        return self.text != self.original
+
+
+class QueryExpander:
+    """
+    Expande las preguntas con el diccionario semántico generado por
+    markdown_analyzer.py antes de calcular su embedding.
+
+    Los acrónimos se resuelven con un diccionario acrónimo → definición y los
+    términos (de varias palabras) con un diccionario de tuplas de tokens, por lo
+    que la expansión es un recorrido lineal de la pregunta con búsquedas O(1).
+    Cada entrada guarda además sus términos más relacionados, ya ordenados.
+    """
+
+    def __init__(self, acronyms, terms, related, max_related=3, max_added=8,
+                 lowercase_acronyms=LOWERCASE_ACRONYMS, known_acronyms=()):
+        self.acronyms = acronyms  # {"FIB": "Facultat d'Informàtica de Barcelona"}
+        # También los acrónimos sin definición: aportan sus términos relacionados
+        self.known_acronyms = set(acronyms) | set(known_acronyms)
+        self.lowercase_acronyms = lowercase_acronyms
+        self.terms = terms  # {("treball", "final"): "treball final"}
+        self.related = related  # {"FIB": ["UPC", "grau"]}
+        self.max_related = max_related
+        self.max_added = max_added
+        self.max_term_length = max((len(key) for key in terms), default=1)
+
+    @classmethod
+    def from_dictionary(cls, path, max_related=3, related=None, **kwargs):
+        """
+        Cargar `{prefijo}_diccionario.json`; los relacionados se ordenan por
+        número de conexiones, salvo que se indiquen en `related` (p. ej. los del
+        grafo CSR, ver `related_from_compact_graph`).
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            dictionary = json.load(f)
+
+        from_connections = related is None
+        related = {} if from_connections else related
+
+        acronyms = {}
+        for acronym, info in dictionary.get("acronimos", {}).items():
+            if info.get("definicion"):
+                acronyms[acronym] = info["definicion"]
+            if from_connections:
+                related[acronym] = [name for name, _ in Counter(info.get("conexiones", [])).most_common(max_related)]
+
+        terms = {}
+        for term, info in dictionary.get("terminos", {}).items():
+            terms[tuple(TOKEN_RE.findall(term.lower()))] = term
+            if from_connections:
+                related[term] = [name for name, _ in Counter(info.get("conexiones", [])).most_common(max_related)]
+
+        return cls(acronyms, terms, related, max_related=max_related,
+                   known_acronyms=dictionary.get("acronimos", {}).keys(), **kwargs)
+
+    @staticmethod
+    def related_from_compact_graph(prefix, max_related=3):
+        """
+        Relacionados de cada nodo según la exportación CSR de markdown_analyzer.py
+        (`{prefijo}_grafo_nodos.json` y `{prefijo}_grafo_csr.npz`): los vecinos
+        ya están ordenados por peso, así que son los primeros de cada fila. None
+        si el grafo no se ha exportado.
+        """
+        import numpy as np
+
+        nodes_path, graph_path = f"{prefix}_grafo_nodos.json", f"{prefix}_grafo_csr.npz"
+        if not (os.path.exists(nodes_path) and os.path.exists(graph_path)):
+            return None
+        with open(nodes_path, "r", encoding="utf-8") as f:
+            names = json.load(f)["nodos"]
+        graph = np.load(graph_path)
+        indptr, indices = graph["indptr"], graph["indices"]
+        return {
+            name: [names[j] for j in indices[indptr[i]:min(indptr[i] + max_related, indptr[i + 1])]]
+            for i, name in enumerate(names)
+        }
+
+    @classmethod
+    def load(cls, prefix="resultados", max_related=3, **kwargs):
+        """
+        Cargar el diccionario de `prefijo`, o None si todavía no se ha generado.
+        Los relacionados salen del grafo CSR si se ha exportado.
+        """
+        path = f"{prefix}_diccionario.json"
+        if not os.path.exists(path):
+            return None
+        related = cls.related_from_compact_graph(prefix, max_related)
+        return cls.from_dictionary(path, max_related=max_related, related=related, **kwargs)
+
+    def _match_acronym(self, token):
+        if token in self.known_acronyms:
+            return token
+        # En minúsculas ("tfg") solo se aceptan los acrónimos de la lista explícita
+        upper = token.upper()
+        if upper in self.lowercase_acronyms and upper in self.known_acronyms:
+            return upper
+        return None
+
+    def expand(self, question):
+        """ Devolver la pregunta con las definiciones de sus acrónimos y los términos relacionados """
+        tokens = TOKEN_RE.findall(question)
+        lowered = [token.lower() for token in tokens]
+        present = set(lowered)
+
+        definitions = {}
+        found = []
+        i = 0
+        while i < len(tokens):
+            acronym = self._match_acronym(tokens[i])
+            if acronym is not None:
+                if acronym in self.acronyms:
+                    definitions.setdefault(acronym, self.acronyms[acronym])
+                found.append(acronym)
+                i += 1
+                continue
+
+            # Término más largo que empieza en esta posición
+            for length in range(min(self.max_term_length, len(tokens) - i), 0, -1):
+                term = self.terms.get(tuple(lowered[i:i + length]))
+                if term is not None:
+                    found.append(term)
+                    i += length
+                    break
+            else:
+                i += 1
+
+        added = []
+        for definition in definitions.values():
+            if definition.lower() not in question.lower():
+                added.append(definition)
+        related = []
+        for name in found:
+            for other in self.related.get(name, ())[:self.max_related]:
+                if other not in found and other not in related and other.lower() not in present:
+                    related.append(other)
+        added.extend(related)
+        added = added[:self.max_added]
+
+        text = f"{question} ({'; '.join(added)})" if added else question
+        return ExpandedQuery(text=text, original=question, definitions=definitions, related=related)
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_RERANKER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+def estimate_tokens(text):
+    """ Estimación rápida de tokens (~4 caracteres por token) sin cargar un tokenizador """
+    return len(text) // 4 + 1
+
+
+class AdaptiveCandidateDepth:
+    """
+    Calcula cuántos candidatos recuperar para re-ordenar según la carga actual.
+
+    La profundidad baja linealmente de `max_depth` a `min_depth` a medida que
+    aumentan las peticiones concurrentes (hasta `high_load`) o cuando la media
+    móvil de la latencia de recuperación y re-ranking supera `target_latency_ms`.
+    """
+
+    def __init__(self, max_depth=30, min_depth=8, high_load=8, target_latency_ms=150.0):
+        self.max_depth = max_depth
+        self.min_depth = min_depth
+        self.high_load = high_load
+        self.target_latency = target_latency_ms / 1000.0
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            load = min(max(self.in_flight - 1, 0) / self.high_load, 1.0)
+            if self.latency_ewma > self.target_latency:
+                # Penalizar también cuando el re-ranking ya es más lento de lo deseado
+                load = max(load, min(self.latency_ewma / self.target_latency - 1.0, 1.0))
+            return round(self.max_depth - (self.max_depth - self.min_depth) * load)
+
+    @contextmanager
+    def acquire(self):
+        """ Registrar una petición en curso y devolver la profundidad que debe usar """
+        with self._lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield self.current()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * elapsed
+
+
+class CrossEncoderReranker:
+    """
+    Re-ordena los candidatos de la búsqueda vectorial con un cross-encoder en CPU.
+
+    Todos los pares (pregunta, fragmento) se puntúan en una única llamada por
+    lotes y se conservan los mejores fragmentos que caben en el presupuesto de
+    tokens del prompt, en lugar de aplicar un umbral fijo de distancia.
+    """
+
+    def __init__(self, model_name=None, token_budget=1200, min_score=None, depth=None):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name or os.getenv("RERANKER_MODEL", DEFAULT_RERANKER_MODEL)
+        self.model = CrossEncoder(self.model_name, device="cpu")
+        self.token_budget = token_budget
+        self.min_score = min_score
+        self.depth = depth or AdaptiveCandidateDepth()
+
+    def rerank(self, query, documents, metadatas, token_budget=None):
+        """ Devolver [(documento, metadatos, puntuación)] ordenados y dentro del presupuesto """
+        if not documents:
+            return []
+
+        scores = self.model.predict(
+            [(query, document) for document in documents],
+            batch_size=len(documents),
+            show_progress_bar=False
+        )
+        ranked = sorted(zip(documents, metadatas, scores), key=lambda item: item[2], reverse=True)
+
+        budget = token_budget or self.token_budget
+        selected = []
+        used = 0
+        for document, metadata, score in ranked:
+            if self.min_score is not None and score < self.min_score:
+                break
+            tokens = estimate_tokens(document)
+            # El mejor fragmento se conserva siempre, aunque supere el presupuesto; los que
+            # no caben se saltan y se sigue buscando otros más cortos que sí quepan
+            if used + tokens > budget and selected:
+                continue
+            selected.append((document, metadata, float(score)))
+            used += tokens
+        return selected
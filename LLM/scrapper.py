@@ -4,17 +4,20 @@ from urllib.parse import urljoin, urlparse
 import os
 import html2text
 from concurrent.futures import ThreadPoolExecutor
+from boilerplate import BoilerplateRemover
 
 start_url = "https://www.fib.upc.edu/en/"
 visited_urls = set()
 output_folder = "./downloaded_pages"
 markdown_folder = "./markdown_pages"
 pdf_folder = "./pdf_pages"
-os.makedirs(output_folder, exist_ok=True)
-os.makedirs(markdown_folder, exist_ok=True)
-os.makedirs(pdf_folder, exist_ok=True)
 
 def save_page(url, content):
+    """Save the page HTML with links rewritten to the local markdown paths.
+
+    Markdown conversion happens after the crawl in convert_pages_to_markdown,
+    once the boilerplate shared by all pages is known.
+    """
     if not url.startswith(start_url):
         return
 
@@ -26,10 +29,8 @@ def save_page(url, content):
         path = os.path.join(*path.split("/"))
 
     html_filepath = os.path.join(output_folder, f"{path}.html")
-    md_filepath = os.path.join(markdown_folder, f"{path}.md")
 
     os.makedirs(os.path.dirname(html_filepath), exist_ok=True)
-    os.makedirs(os.path.dirname(md_filepath), exist_ok=True)
 
     soup = BeautifulSoup(content, "html.parser")
     for link in soup.find_all("a", href=True):
@@ -48,10 +49,35 @@ def save_page(url, content):
         f.write(updated_content)
     print(f"Saved HTML: {html_filepath}")
 
-    markdown_content = html2text.html2text(updated_content)
-    with open(md_filepath, "w", encoding="utf-8") as f:
-        f.write(markdown_content)
-    print(f"Saved Markdown: {md_filepath}")
+def iter_saved_pages():
+    for root, _, files in os.walk(output_folder):
+        for filename in files:
+            if filename.endswith(".html"):
+                yield os.path.join(root, filename)
+
+def read_page(html_filepath):
+    with open(html_filepath, "r", encoding="utf-8") as f:
+        return f.read()
+
+def convert_pages_to_markdown():
+    """Convert every saved page to markdown without the header, menus and footer.
+
+    A first pass learns which DOM blocks repeat across the crawl; the second
+    drops them (plus known navigation elements) before running html2text, so
+    the template is not duplicated in every chunk and embedding.
+    """
+    remover = BoilerplateRemover().fit(read_page(path) for path in iter_saved_pages())
+    print(f"Learned boilerplate from {remover.pages_seen} pages")
+
+    for html_filepath in iter_saved_pages():
+        relative_path = os.path.relpath(html_filepath, output_folder)
+        md_filepath = os.path.join(markdown_folder, os.path.splitext(relative_path)[0] + ".md")
+        os.makedirs(os.path.dirname(md_filepath), exist_ok=True)
+
+        markdown_content = html2text.html2text(remover.clean(read_page(html_filepath)))
+        with open(md_filepath, "w", encoding="utf-8") as f:
+            f.write(markdown_content)
+        print(f"Saved Markdown: {md_filepath}")
 
 def save_pdf(url):
     try:
@@ -117,4 +143,13 @@ def crawl(url):
     with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
         executor.map(crawl, links_to_crawl)
 
-crawl(start_url)
\ No newline at end of file
+def main():
+    os.makedirs(output_folder, exist_ok=True)
+    os.makedirs(markdown_folder, exist_ok=True)
+    os.makedirs(pdf_folder, exist_ok=True)
+
+    crawl(start_url)
+    convert_pages_to_markdown()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,8 +1,10 @@
-# app/api/__init__.py
+﻿# app/api/__init__.py
 from fastapi import APIRouter
-from app.api.endpoints import users, conversations, chat
+from app.api.endpoints import users, conversations, chat, profiles, ingestion
 
 api_router = APIRouter()
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(conversations.router, prefix="/conversations", tags=["conversations"])
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
+api_router.include_router(profiles.router, prefix="/admin/profiles", tags=["admin"])
+api_router.include_router(ingestion.router, prefix="/admin/ingestion", tags=["admin"])
@@ -0,0 +1,12 @@
+﻿# app/api/dependencies.py
+import secrets
+
+from fastapi import Header, HTTPException, status
+
+from app.core.config import settings
+
+
+async def require_admin(x_admin_token: str = Header(default="")):
+    """Restringe el endpoint a quien presente el token de administración (ADMIN_TOKEN)"""
+    if not settings.ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso restringido a administradores")
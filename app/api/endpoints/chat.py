@@ -1,10 +1,12 @@
 ﻿# app/api/endpoints/chat.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.services.auth_service import get_current_user
+from app.services.cancellation import cancel_on_disconnect
 from app.services.chat_service import process_message
+from app.services.chat_socket import ChatConnection
 from app.db.models import User
 from app.core.schemas import ChatResponse, ChatRequest
 
@@ -14,18 +16,28 @@ router = APIRouter()
 @router.post("/", response_model=ChatResponse)
 async def chat_endpoint(
         chat_request: ChatRequest,
+        request: Request,
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Endpoint para procesar mensajes de chat y obtener respuestas"""
     try:
-        result = await process_message(
+        # Si el cliente se desconecta se cancelan la búsqueda y la generación pendientes
+        result = await cancel_on_disconnect(request, process_message(
             db,
             current_user.id,
             chat_request.message,
             chat_request.conversation_id
-        )
+        ))
 
         return result
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al procesar mensaje: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error al procesar mensaje: {str(e)}")
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """Canal WebSocket del chat: una autenticación por conexión y respuestas en streaming"""
+    await ChatConnection(websocket).run()
@@ -1,26 +1,42 @@
 ﻿# app/api/endpoints/conversations.py
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.services.auth_service import get_current_user
-from app.db.models import User, Conversation
+from app.db.models import User, Conversation, Message
+from app.services.context_cache import context_cache
 from app.core.schemas import ConversationListResponse, ConversationResponse, ConversationCreate, ConversationUpdate
 
 router = APIRouter()
 
 
+def rows_as_dicts(query):
+    """
+    Filas de una consulta por columnas como diccionarios.
+
+    Las respuestas de lectura se devuelven así con ORJSONResponse: FastAPI no
+    valida un Response, y con miles de mensajes crear y validar un objeto ORM
+    y un modelo de pydantic por mensaje es lo más caro de la petición. Los
+    `response_model` siguen documentando el formato en OpenAPI.
+    """
+    return [row._asdict() for row in query]
+
+
 @router.get("/", response_model=List[ConversationListResponse])
 async def get_conversations(
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Obtener todas las conversaciones del usuario"""
-    conversations = db.query(Conversation).filter(
+    conversations = db.query(
+        Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at
+    ).filter(
         Conversation.user_id == current_user.id
-    ).order_by(Conversation.updated_at.desc()).all()
-    return conversations
+    ).order_by(Conversation.updated_at.desc())
+    return ORJSONResponse(rows_as_dicts(conversations))
 
 
 @router.post("/", response_model=ConversationResponse)
@@ -47,7 +63,9 @@ async def get_conversation(
         current_user: User = Depends(get_current_user)
 ):
     """Obtener una conversación específica con sus mensajes"""
-    conversation = db.query(Conversation).filter(
+    conversation = db.query(
+        Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at
+    ).filter(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
     ).first()
@@ -55,7 +73,12 @@ async def get_conversation(
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversación no encontrada")
 
-    return conversation
+    messages = db.query(
+        Message.id, Message.content, Message.is_user, Message.timestamp
+    ).filter(
+        Message.conversation_id == conversation_id
+    ).order_by(Message.timestamp, Message.id)
+    return ORJSONResponse({**conversation._asdict(), "messages": rows_as_dicts(messages)})
 
 
 @router.put("/{conversation_id}", response_model=ConversationResponse)
@@ -76,6 +99,7 @@ async def update_conversation(
 
     db_conversation.title = conversation_update.title
     db.commit()
+    context_cache.invalidate(conversation_id)
     db.refresh(db_conversation)
     return db_conversation
 
@@ -97,4 +121,5 @@ async def delete_conversation(
 
     db.delete(db_conversation)
     db.commit()
+    context_cache.invalidate(conversation_id)
     return {"message": "Conversación eliminada"}
\ No newline at end of file
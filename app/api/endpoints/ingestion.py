@@ -0,0 +1,84 @@
+﻿# app/api/endpoints/ingestion.py
+import re
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+
+from app.api.dependencies import require_admin
+from app.services import ingestion_service
+from app.services.ingestion_service import IngestionConflict
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+RUN_ID_RE = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{6}$")
+
+
+class IngestionRequest(BaseModel):
+    stages: Optional[List[str]] = None
+
+
+def _check_run_id(run_id: str):
+    if not RUN_ID_RE.match(run_id):
+        raise HTTPException(status_code=404, detail="Ingesta no encontrada")
+
+
+@router.post("/runs", status_code=202)
+async def start_ingestion(request: IngestionRequest):
+    """Lanzar una ingesta completa o solo de las etapas indicadas"""
+    try:
+        return ingestion_service.start_run(request.stages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IngestionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/runs")
+async def list_ingestions():
+    return ingestion_service.list_runs()
+
+
+@router.get("/runs/{run_id}")
+async def get_ingestion(run_id: str):
+    """Estado, progreso y throughput de cada etapa"""
+    _check_run_id(run_id)
+    state = ingestion_service.get_run(run_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Ingesta no encontrada")
+    return state
+
+
+@router.get("/runs/{run_id}/log")
+async def get_ingestion_log(run_id: str):
+    _check_run_id(run_id)
+    path = ingestion_service.run_log_path(run_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Ingesta no encontrada")
+    return FileResponse(path, media_type="text/plain")
+
+
+@router.post("/runs/{run_id}/cancel", status_code=202)
+async def cancel_ingestion(run_id: str):
+    _check_run_id(run_id)
+    try:
+        state = ingestion_service.cancel_run(run_id)
+    except IngestionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if state is None:
+        raise HTTPException(status_code=404, detail="Ingesta no encontrada")
+    return state
+
+
+@router.post("/runs/{run_id}/resume", status_code=202)
+async def resume_ingestion(run_id: str):
+    """Reanudar una ingesta fallida o cancelada desde la primera etapa no completada"""
+    _check_run_id(run_id)
+    try:
+        state = ingestion_service.resume_run(run_id)
+    except IngestionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if state is None:
+        raise HTTPException(status_code=404, detail="Ingesta no encontrada")
+    return state
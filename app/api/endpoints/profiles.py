@@ -0,0 +1,33 @@
+﻿# app/api/endpoints/profiles.py
+import os
+import re
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from app.api.dependencies import require_admin
+from app.core.config import settings
+from app.core.profiling import list_profiles
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+@router.get("/")
+async def get_profiles():
+    """Listar los perfiles guardados (sin las sentencias SQL)"""
+    return list_profiles(settings.PROFILE_DIR)
+
+
+@router.get("/{profile_id}")
+async def download_profile(profile_id: str, sql: bool = False):
+    """Descargar un perfil, o su resumen con las sentencias SQL si `sql` es verdadero"""
+    if not PROFILE_ID_RE.match(profile_id):
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+
+    extension = "json" if sql else "html"
+    path = os.path.join(settings.PROFILE_DIR, f"{profile_id}.{extension}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(path, filename=f"profile-{profile_id}.{extension}")
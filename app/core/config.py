@@ -13,6 +13,34 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Chatbot"
     VERSION: str = "0.0.1"
     PROJECT_DESCRIPTION: str = "API para el chatbot de la FIB"
+    CONTEXT_CACHE_MAX_CONVERSATIONS: int = 1000
+    CONTEXT_CACHE_WINDOW: int = 10
+    RAG_ENABLED: bool = False
+    DICTIONARY_PREFIX: str = "LLM/resultados"
+    CHROMA_PATH: str = "LLM/chroma_db"
+    CHROMA_COLLECTION: str = "markdown_docs"
+    EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
+    RAG_TOP_K: int = 5
+    RAG_TOP_K_EXPANDED: int = 3
+    RERANKER_ENABLED: bool = False
+    RERANKER_TOKEN_BUDGET: int = 1200
+    LLM_API_URL: str = "http://127.0.0.1:1234/v1/chat/completions"
+    LLM_MODEL: str = "local-model"
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    SINGLE_FLIGHT_ENABLED: bool = True
+    WS_AUTH_TIMEOUT_SECONDS: float = 10.0
+    WS_MAX_IN_FLIGHT: int = 4
+    GZIP_MINIMUM_SIZE: int = 1000
+    GZIP_COMPRESSLEVEL: int = 5
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_FILES: int = 100
+    INGESTION_WORKDIR: str = "LLM"
+    INDEX_RELOAD_SECONDS: float = 5.0
+    READINESS_RETRY_SECONDS: float = 5.0
+    READINESS_RETRY_MAX_SECONDS: float = 60.0
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,81 @@
+﻿# app/core/metrics.py
+import threading
+from typing import Callable, Dict, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+
+# Límites pensados para etapas que van de ~1 ms (caché) a decenas de segundos (LLM)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    "chatbot_stage_duration_seconds",
+    "Duración de cada etapa del procesamiento de un mensaje",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+UPSTREAM_ERRORS = Counter(
+    "chatbot_upstream_errors_total",
+    "Errores de los servicios externos (LLM, índice vectorial, embeddings)",
+    ["upstream"]
+)
+
+CANCELLED_REQUESTS = Counter(
+    "chatbot_cancelled_requests_total",
+    "Preguntas abandonadas antes de terminar (desconexión, cancelación o pregunta nueva)",
+    ["reason"]
+)
+
+CANCELLED_WORK = Counter(
+    "chatbot_cancelled_work_total",
+    "Trabajo interrumpido por preguntas abandonadas (búsquedas y generaciones del LLM)",
+    ["stage"]
+)
+
+
+def track_stage(stage: str):
+    """Context manager (o decorador) que mide la duración de una etapa"""
+    return STAGE_LATENCY.labels(stage=stage).time()
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+
+class CacheStatsCollector:
+    """
+    Expone como contadores los aciertos y fallos de las cachés en memoria.
+
+    Cada caché registra una función que devuelve (aciertos, fallos); los
+    valores se leen en cada scrape, así las rutas críticas no hacen nada extra.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, stats: Callable[[], Tuple[int, int]]):
+        with self._lock:
+            self._sources[name] = stats
+
+    def collect(self):
+        hits = CounterMetricFamily("chatbot_cache_hits", "Aciertos de las cachés en memoria", labels=["cache"])
+        misses = CounterMetricFamily("chatbot_cache_misses", "Fallos de las cachés en memoria", labels=["cache"])
+        with self._lock:
+            sources = list(self._sources.items())
+        for name, stats in sources:
+            cache_hits, cache_misses = stats()
+            hits.add_metric([name], cache_hits)
+            misses.add_metric([name], cache_misses)
+        yield hits
+        yield misses
+
+
+cache_stats = CacheStatsCollector()
+REGISTRY.register(cache_stats)
+
+
+def render_metrics():
+    """Devuelve (contenido, content type) en el formato de exposición de Prometheus"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,161 @@
+﻿# app/core/profiling.py
+import json
+import logging
+import os
+import random
+import secrets
+import time
+import uuid
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+ADMIN_HEADER = b"x-admin-token"
+
+# Solo se perfila una petición a la vez: los perfiladores no admiten sesiones simultáneas
+_active = {"busy": False}
+
+# Lista de sentencias SQL de la petición que se está perfilando (None si no se perfila)
+_sql_statements: ContextVar[Optional[List[dict]]] = ContextVar("profiling_sql_statements", default=None)
+
+
+def instrument_engine(engine):
+    """Registra en el engine los eventos que anotan las sentencias SQL de las peticiones perfiladas"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _sql_statements.get() is not None:
+            conn.info.setdefault("profiling_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements = _sql_statements.get()
+        if statements is None or not conn.info.get("profiling_start"):
+            return
+        elapsed = time.perf_counter() - conn.info["profiling_start"].pop()
+        statements.append({"statement": statement, "duration_ms": round(elapsed * 1000, 3)})
+
+
+def _load_profiler():
+    """
+    Clase Profiler de pyinstrument, o None si no está instalado. No hay
+    alternativa: cProfile mezcla en el perfil todas las corrutinas que se
+    ejecutan a la vez en el bucle de eventos y no ve el trabajo del pool de
+    hilos, así que sus perfiles serían engañosos.
+    """
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    return Profiler
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila una fracción `sample_rate` de las peticiones, o
+    las que llevan la cabecera `X-Profile` junto con un `X-Admin-Token` válido.
+
+    Para cada petición perfilada se guardan en `PROFILE_DIR` el perfil HTML de
+    pyinstrument y un JSON con la ruta, la duración y las sentencias SQL
+    ejecutadas con sus tiempos. Las peticiones no seleccionadas solo cuestan
+    una comprobación de cabecera y un número aleatorio. Sin pyinstrument el
+    middleware no perfila nada.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, directory: str = "profiles", max_profiles: int = 100):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.profiler_class = _load_profiler()
+        if self.profiler_class is None:
+            logger.warning("pyinstrument no está instalado: el perfilado de peticiones queda desactivado")
+        os.makedirs(directory, exist_ok=True)
+
+    def _selected(self, scope) -> bool:
+        headers = dict(scope.get("headers") or ())
+        if PROFILE_HEADER in headers:
+            token = headers.get(ADMIN_HEADER, b"").decode()
+            return bool(settings.ADMIN_TOKEN) and secrets.compare_digest(token, settings.ADMIN_TOKEN)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or self.profiler_class is None
+                or _active["busy"] or not self._selected(scope)):
+            await self.app(scope, receive, send)
+            return
+        _active["busy"] = True
+
+        profile_id = uuid.uuid4().hex
+        statements: List[dict] = []
+        status = {"code": None}
+        token = _sql_statements.set(statements)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", []).append((b"x-profile-id", profile_id.encode()))
+            await send(message)
+
+        # Con async_mode="enabled" solo se muestrea el contexto de esta petición
+        profiler = self.profiler_class(async_mode="enabled")
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            duration = time.perf_counter() - start
+            _sql_statements.reset(token)
+            _active["busy"] = False
+            # Generar el HTML y escribir los archivos fuera del bucle de eventos
+            await run_in_threadpool(self._store, profile_id, profiler, {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status["code"],
+                "duration_ms": round(duration * 1000, 3),
+                "created_at": time.time(),
+                "profile": f"{profile_id}.html",
+                "sql_total_ms": round(sum(s["duration_ms"] for s in statements), 3),
+                "sql": statements
+            })
+
+    def _store(self, profile_id: str, profiler, summary: dict):
+        with open(os.path.join(self.directory, f"{profile_id}.html"), "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        self._prune()
+
+    def _prune(self):
+        summaries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in summaries[:max(len(summaries) - self.max_profiles, 0)]:
+            profile_id = entry.name[:-len(".json")]
+            for name in os.listdir(self.directory):
+                if name.startswith(profile_id):
+                    os.remove(os.path.join(self.directory, name))
+
+
+def list_profiles(directory: str) -> List[dict]:
+    """Resúmenes de los perfiles guardados, del más reciente al más antiguo"""
+    summaries = []
+    if not os.path.isdir(directory):
+        return summaries
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                summary = json.load(f)
+            summary.pop("sql", None)
+            summaries.append(summary)
+    return sorted(summaries, key=lambda summary: summary["created_at"], reverse=True)
@@ -5,6 +5,7 @@ from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.metrics import track_stage
 from app.core.security import verify_password
 from app.db.database import get_db
 from app.db.models import User
@@ -26,25 +27,31 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
-async def get_current_user(
-        db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-):
+def user_from_token(db: Session, token: str) -> User:
+    """Usuario del token JWT; lanza 401 si el token no es válido o el usuario no existe"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciales inválidas",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        username: str = payload.get("sub")
-        if username is None:
+    with track_stage("auth"):
+        try:
+            payload = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+            )
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username)
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = get_user(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+        user = get_user(db, username=token_data.username)
+        if user is None:
+            raise credentials_exception
+        return user
+
+
+async def get_current_user(
+        db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+):
+    return user_from_token(db, token)
@@ -0,0 +1,73 @@
+﻿# app/services/cancellation.py
+import asyncio
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, status
+
+from app.core.metrics import CANCELLED_REQUESTS
+
+
+class InFlightRegistry:
+    """
+    Pregunta en curso de cada conversación (en este worker).
+
+    Cuando llega una pregunta nueva a una conversación que todavía está
+    generando la respuesta anterior, la anterior se cancela: el usuario ya no
+    la va a leer y solo ocuparía capacidad del LLM.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def register(self, conversation_id: int, task: Optional[asyncio.Task] = None):
+        task = task or asyncio.current_task()
+        previous = self._tasks.get(conversation_id)
+        if previous is not None and previous is not task and not previous.done():
+            previous.cancel()
+            CANCELLED_REQUESTS.labels(reason="superseded").inc()
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._release(conversation_id, task))
+
+    def _release(self, conversation_id: int, task: asyncio.Task):
+        if self._tasks.get(conversation_id) is task:
+            del self._tasks[conversation_id]
+
+
+in_flight = InFlightRegistry()
+
+
+async def _wait_for_disconnect(request: Request):
+    # El cuerpo ya se ha leído: el siguiente mensaje ASGI solo puede ser la desconexión
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, coroutine):
+    """
+    Ejecuta `coroutine` y la cancela si el cliente se desconecta antes de que
+    termine (pestaña cerrada, petición abortada), de modo que la búsqueda y la
+    generación del LLM se interrumpen.
+    """
+    task = asyncio.ensure_future(coroutine)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+
+    if not task.done():
+        task.cancel()
+        CANCELLED_REQUESTS.labels(reason="disconnect").inc()
+        # Nadie va a leer esta respuesta (499, como en nginx)
+        raise HTTPException(status_code=499, detail="El cliente se ha desconectado")
+    if task.cancelled():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La pregunta se ha cancelado porque se ha enviado otra en la misma conversación"
+        )
+    return task.result()
@@ -2,7 +2,11 @@
 from datetime import datetime
 from sqlalchemy.orm import Session
 
+from app.core.metrics import track_stage
 from app.db.models import Conversation, Message
+from app.services.cancellation import in_flight
+from app.services.context_cache import CachedMessage, context_cache
+from app.services.rag_service import rag_service
 
 
 def create_new_conversation(db: Session, user_id: int, title: str = "Nueva conversación"):
@@ -15,6 +19,8 @@ def create_new_conversation(db: Session, user_id: int, title: str = "Nueva conve
     db.add(conversation)
     db.commit()
     db.refresh(conversation)
+    # Una conversación nueva no tiene mensajes: se puede cachear sin leer la base de datos
+    context_cache.set(conversation.id, [], version=conversation.updated_at)
     return conversation
 
 
@@ -28,6 +34,7 @@ def get_or_create_conversation(db: Session, conversation_id: int = None, user_id
         return create_new_conversation(db, user_id)
 
 
+@track_stage("persistence")
 def save_message(db: Session, conversation_id: int, content: str, is_user: bool):
     message = Message(
         conversation_id=conversation_id,
@@ -38,21 +45,29 @@ def save_message(db: Session, conversation_id: int, content: str, is_user: bool)
     db.add(message)
     db.commit()
     db.refresh(message)
+    context_cache.append(conversation_id, CachedMessage.from_orm_message(message))
     return message
 
 
-def get_conversation_context(db: Session, conversation_id: int, max_messages: int = 10):
+@track_stage("db_context")
+def get_conversation_context(db: Session, conversation_id: int, max_messages: int = 10, version=None):
     """Obtiene el contexto de la conversación para usarlo en el modelo de lenguaje"""
+    cached = context_cache.get(conversation_id, max_messages, version=version)
+    if cached is not None:
+        return cached
+
     messages = (
         db.query(Message)
         .filter(Message.conversation_id == conversation_id)
         .order_by(Message.timestamp.desc())
-        .limit(max_messages)
+        .limit(max(max_messages, context_cache.window_size))
         .all()
     )
     # Invertimos para tener el orden cronológico
     messages.reverse()
-    return messages
+    snapshot = [CachedMessage.from_orm_message(message) for message in messages]
+    context_cache.set(conversation_id, snapshot, version=version)
+    return snapshot[-max_messages:] if max_messages > 0 else []
 
 
 def get_conversation_with_messages(db: Session, conversation_id: int):
@@ -64,24 +79,50 @@ def get_conversation_with_messages(db: Session, conversation_id: int):
 
 async def process_message(db: Session, user_id: int, message: str, conversation_id: int = None):
     """Procesa un mensaje y genera una respuesta del chatbot"""
+    with track_stage("total"):
+        return await _process_message(db, user_id, message, conversation_id)
+
+
+async def _process_message(db: Session, user_id: int, message: str, conversation_id: int = None):
+    conversation, context = start_message(db, user_id, message, conversation_id)
+    response = "".join([delta async for delta in stream_response(message, context)])
+    finish_message(db, conversation, response)
+    return {"response": response, "conversation_id": conversation.id}
+
+
+def start_message(db: Session, user_id: int, message: str, conversation_id: int = None):
+    """Guarda el mensaje del usuario y devuelve la conversación y su contexto"""
     # Obtener o crear conversación
     conversation = get_or_create_conversation(db, conversation_id, user_id)
+    version = conversation.updated_at
+    # Una pregunta nueva cancela la que siga en curso en la misma conversación
+    in_flight.register(conversation.id)
 
     # Guardar mensaje del usuario
     save_message(db, conversation.id, message, True)
 
-    # Obtener contexto de la conversación
-    context = get_conversation_context(db, conversation.id)
+    # Obtener contexto de la conversación (desde la caché si la conversación está activa)
+    context = get_conversation_context(db, conversation.id, version=version)
+    return conversation, context
 
-    # Aquí se conectaría con el servicio externo de chatbot
-    # Por ahora, simularemos una respuesta simple
-    response = f"Respuesta simulada a: {message}"
 
+async def stream_response(message: str, context):
+    """Fragmentos de la respuesta a medida que se generan"""
+    # Recuperar contexto del índice y generar la respuesta con el modelo local
+    if rag_service.enabled:
+        retrieved = await rag_service.retrieve_shared(message)
+        async for delta in rag_service.answer_stream(message, retrieved, context):
+            yield delta
+    else:
+        yield f"Respuesta simulada a: {message}"
+
+
+def finish_message(db: Session, conversation: Conversation, response: str):
     # Guardar respuesta del sistema
     save_message(db, conversation.id, response, False)
 
     # Actualizar timestamp de la conversación
-    conversation.updated_at = datetime.utcnow()
-    db.commit()
-
-    return {"response": response, "conversation_id": conversation.id}
+    with track_stage("persistence"):
+        conversation.updated_at = datetime.utcnow()
+        db.commit()
+    context_cache.set_version(conversation.id, conversation.updated_at)
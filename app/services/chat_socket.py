@@ -0,0 +1,156 @@
+﻿# app/services/chat_socket.py
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+from jose import jwt
+
+from app.core.config import settings
+from app.core.metrics import CANCELLED_REQUESTS, track_stage
+from app.db.database import SessionLocal
+from app.services.auth_service import user_from_token
+from app.services.chat_service import finish_message, start_message, stream_response
+
+logger = logging.getLogger(__name__)
+
+
+class ChatConnection:
+    """
+    Una conexión WebSocket del chat, autenticada una sola vez al abrirse.
+
+    Protocolo (mensajes JSON):
+
+    - cliente → `{"type": "auth", "token": ...}` como primer mensaje; el
+      servidor contesta `{"type": "ready", "user": ...}` o cierra con 1008.
+    - cliente → `{"type": "message", "id": ..., "conversation_id": ..., "message": ...}`;
+      `id` lo elige el cliente y permite tener varias preguntas (de la misma
+      o de distintas conversaciones) en curso a la vez.
+    - servidor → `start` (con el `conversation_id`, que puede ser nuevo),
+      `token` (con cada `delta` del texto), y `done` con la respuesta
+      completa, o `error` con `detail`.
+    - cliente → `{"type": "cancel", "id": ...}` detiene la generación en curso
+      (el servidor contesta `cancelled` y no guarda la respuesta).
+
+    Un mensaje que no es un objeto JSON recibe `error` y la conexión sigue abierta.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.user = None
+        self.expires_at = None
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Las tareas de cada pregunta escriben en el mismo socket
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, **message):
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def receive(self) -> Optional[dict]:
+        """Siguiente mensaje del cliente, o None si no es un objeto JSON"""
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+        data = message.get("text")
+        try:
+            data = json.loads(data if data is not None else message.get("bytes") or b"")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    async def authenticate(self) -> bool:
+        try:
+            message = await asyncio.wait_for(self.receive(), settings.WS_AUTH_TIMEOUT_SECONDS)
+            token = message.get("token") if message is not None and message.get("type") == "auth" else None
+            if not token or not isinstance(token, str):
+                raise ValueError("Se esperaba un mensaje de autenticación")
+            db = SessionLocal()
+            try:
+                self.user = user_from_token(db, token)
+            finally:
+                db.close()
+            self.expires_at = jwt.get_unverified_claims(token).get("exp")
+        except (asyncio.TimeoutError, ValueError, HTTPException):
+            await self.websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return False
+        await self.send(type="ready", user=self.user.username)
+        return True
+
+    async def run(self):
+        await self.websocket.accept()
+        if not await self.authenticate():
+            return
+        try:
+            while True:
+                message = await self.receive()
+                if self.expires_at is not None and time.time() > self.expires_at:
+                    await self.websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token caducado")
+                    break
+                if message is None:
+                    await self.send(type="error", id="", detail="Se esperaba un objeto JSON")
+                    continue
+                await self.dispatch(message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            # Las preguntas de una conexión cerrada ya no tienen a quién responder
+            for task in list(self.tasks.values()):
+                if not task.done():
+                    task.cancel()
+                    CANCELLED_REQUESTS.labels(reason="disconnect").inc()
+
+    async def dispatch(self, message: dict):
+        kind, request_id = message.get("type"), str(message.get("id", ""))
+        if kind == "message":
+            text = message.get("message")
+            text = text.strip() if isinstance(text, str) else ""
+            conversation_id = message.get("conversation_id")
+            if conversation_id is not None and not isinstance(conversation_id, int):
+                text = ""
+            if not request_id or not text or request_id in self.tasks:
+                await self.send(type="error", id=request_id, detail="Mensaje no válido")
+            elif len(self.tasks) >= settings.WS_MAX_IN_FLIGHT:
+                await self.send(type="error", id=request_id, detail="Demasiadas preguntas en curso")
+            else:
+                task = asyncio.ensure_future(self.answer(request_id, text, conversation_id))
+                self.tasks[request_id] = task
+                task.add_done_callback(lambda _: self.tasks.pop(request_id, None))
+        elif kind == "cancel":
+            task = self.tasks.get(request_id)
+            if task is not None and not task.done():
+                task.cancel()
+                CANCELLED_REQUESTS.labels(reason="client").inc()
+        else:
+            await self.send(type="error", id=request_id, detail=f"Tipo de mensaje desconocido: {kind}")
+
+    async def answer(self, request_id: str, text: str, conversation_id=None):
+        db = SessionLocal()
+        try:
+            with track_stage("total"):
+                conversation, context = start_message(db, self.user.id, text, conversation_id)
+                await self.send(type="start", id=request_id, conversation_id=conversation.id)
+                parts = []
+                async for delta in stream_response(text, context):
+                    parts.append(delta)
+                    await self.send(type="token", id=request_id, delta=delta)
+                response = "".join(parts)
+                finish_message(db, conversation, response)
+            await self.send(type="done", id=request_id, conversation_id=conversation.id, response=response)
+        except asyncio.CancelledError:
+            await self._send_quietly(type="cancelled", id=request_id)
+            raise
+        except Exception as e:
+            logger.exception("Error al procesar el mensaje %s", request_id)
+            await self._send_quietly(type="error", id=request_id, detail=f"Error al procesar mensaje: {str(e)}")
+        finally:
+            db.close()
+
+    async def _send_quietly(self, **message):
+        # El socket puede estar ya cerrado
+        try:
+            await self.send(**message)
+        except Exception:
+            pass
@@ -0,0 +1,115 @@
+﻿# app/services/context_cache.py
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import cache_stats
+
+
+@dataclass(frozen=True)
+class CachedMessage:
+    """Copia ligera de un mensaje, independiente de la sesión de SQLAlchemy"""
+    id: int
+    content: str
+    is_user: bool
+    timestamp: datetime
+
+    @classmethod
+    def from_orm_message(cls, message):
+        return cls(
+            id=message.id,
+            content=message.content,
+            is_user=message.is_user,
+            timestamp=message.timestamp
+        )
+
+
+class ConversationContextCache:
+    """
+    Caché LRU en memoria de las últimas ventanas de mensajes por conversación.
+
+    Cada entrada guarda como máximo `window_size` mensajes en orden cronológico
+    junto con la versión (`updated_at` de la conversación) con la que se
+    sincronizó por última vez. Si otro worker ha añadido mensajes, la versión no
+    coincide y la entrada se descarta, así que cada proceso puede tener su propia
+    caché sin servir contexto obsoleto.
+
+    Cuando se supera `max_conversations` se expulsa la conversación usada hace
+    más tiempo, de modo que la memoria queda acotada aunque haya muchas
+    conversaciones inactivas.
+    """
+
+    def __init__(self, max_conversations: int = 1000, window_size: int = 10):
+        self.max_conversations = max_conversations
+        self.window_size = window_size
+        self._windows: "OrderedDict[int, Deque[CachedMessage]]" = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: int, max_messages: int, version=None) -> Optional[List[CachedMessage]]:
+        """Devuelve los últimos `max_messages` mensajes o None si no hay entrada válida"""
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if (
+                window is None
+                or max_messages > self.window_size
+                or (version is not None and self._versions.get(conversation_id) != version)
+            ):
+                self.misses += 1
+                return None
+            self._windows.move_to_end(conversation_id)
+            self.hits += 1
+            return list(window)[-max_messages:] if max_messages > 0 else []
+
+    def set(self, conversation_id: int, messages: List[CachedMessage], version=None):
+        """Guarda la ventana completa de una conversación leída de la base de datos"""
+        with self._lock:
+            self._windows[conversation_id] = deque(messages[-self.window_size:], maxlen=self.window_size)
+            self._versions[conversation_id] = version
+            self._windows.move_to_end(conversation_id)
+            self._evict()
+
+    def append(self, conversation_id: int, message: CachedMessage):
+        """Añade un mensaje recién guardado, solo si la conversación ya está en caché"""
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is None:
+                return
+            window.append(message)
+            self._windows.move_to_end(conversation_id)
+
+    def set_version(self, conversation_id: int, version):
+        """Marca la entrada como sincronizada con la versión actual de la conversación"""
+        with self._lock:
+            if conversation_id in self._windows:
+                self._versions[conversation_id] = version
+
+    def invalidate(self, conversation_id: int):
+        with self._lock:
+            self._windows.pop(conversation_id, None)
+            self._versions.pop(conversation_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _evict(self):
+        while len(self._windows) > self.max_conversations:
+            conversation_id, _ = self._windows.popitem(last=False)
+            self._versions.pop(conversation_id, None)
+
+
+context_cache = ConversationContextCache(
+    max_conversations=settings.CONTEXT_CACHE_MAX_CONVERSATIONS,
+    window_size=settings.CONTEXT_CACHE_WINDOW
+)
+cache_stats.register("conversation_context", lambda: (context_cache.hits, context_cache.misses))
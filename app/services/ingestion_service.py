@@ -0,0 +1,176 @@
+﻿# app/services/ingestion_service.py
+import os
+import signal
+import subprocess
+import sys
+from contextlib import contextmanager
+from typing import List, Optional
+
+from LLM import pipeline
+from LLM.index_versions import file_lock
+
+from app.core.config import settings
+
+# Procesos lanzados por este worker, para recoger su código de salida
+_processes = {}
+
+
+class IngestionConflict(Exception):
+    pass
+
+
+def _runs_dir():
+    return os.path.join(settings.INGESTION_WORKDIR, pipeline.RUNS_DIR)
+
+
+@contextmanager
+def _ingestion_lock():
+    """
+    Lock de archivo compartido por todos los workers de uvicorn: comprobar que
+    no hay otra ingesta activa y lanzar la nueva es atómico entre procesos. El
+    sistema lo libera si el worker muere.
+    """
+    os.makedirs(_runs_dir(), exist_ok=True)
+    with file_lock(os.path.join(_runs_dir(), ".lock")):
+        yield
+
+
+def _runner_pid(state: dict) -> Optional[int]:
+    """Pid del runner: lo anota el worker que lo lanza (antes de que el runner escriba su estado)"""
+    try:
+        with open(os.path.join(_runs_dir(), state["id"], "runner.pid"), "r") as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return state.get("pid")
+
+
+def _pid_exists(pid: int) -> bool:
+    if os.name == "nt":
+        # En Windows os.kill(pid, 0) terminaría el proceso en vez de comprobarlo
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _is_alive(run_id: str, pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    process = _processes.get(pid)
+    if process is not None:
+        return process.poll() is None
+    if not _pid_exists(pid):
+        return False
+    # Tras un reinicio el pid puede pertenecer a otro proceso: comprobar que es el runner de esta ingesta
+    # (donde no hay /proc, como en Windows, se da por bueno)
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            arguments = f.read().split(b"\0")
+    except OSError:
+        return True
+    return b"pipeline.py" in arguments and run_id.encode() in arguments
+
+
+def _with_liveness(state: dict) -> dict:
+    """
+    Una ejecución "running" cuyo proceso ya no existe se ha interrumpido (p. ej.
+    por un reinicio); igual que una "pending" cuyo runner se lanzó pero murió
+    antes de empezar.
+    """
+    pid = _runner_pid(state)
+    alive = _is_alive(state["id"], pid)
+    state = {**state, "runner_alive": alive}
+    if state["status"] in (pipeline.RUNNING, pipeline.PENDING) and pid and not alive:
+        state.update(status=pipeline.FAILED, detail="El proceso de ingesta terminó inesperadamente")
+    return state
+
+
+def _active_runs() -> List[dict]:
+    # Una ejecución recién lanzada o reanudada tiene el runner vivo aunque aún no haya cambiado su estado
+    return [state for state in list_runs() if state["runner_alive"]]
+
+
+def list_runs() -> List[dict]:
+    return [_with_liveness(state) for state in pipeline.list_runs(_runs_dir())]
+
+
+def get_run(run_id: str) -> Optional[dict]:
+    try:
+        return _with_liveness(pipeline.load_run(run_id, _runs_dir()))
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _spawn(run_id: str):
+    """Lanza el runner en un proceso aparte: la ingesta nunca ocupa a los workers que sirven peticiones"""
+    log = open(os.path.join(_runs_dir(), run_id, "pipeline.log"), "a", encoding="utf-8")
+    process = subprocess.Popen(
+        [sys.executable, "pipeline.py", "--run-id", run_id],
+        cwd=settings.INGESTION_WORKDIR,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        start_new_session=True
+    )
+    log.close()
+    _processes[process.pid] = process
+    with open(os.path.join(_runs_dir(), run_id, "runner.pid"), "w") as f:
+        f.write(str(process.pid))
+
+
+def start_run(stages: Optional[List[str]] = None) -> dict:
+    with _ingestion_lock():
+        if _active_runs():
+            raise IngestionConflict("Ya hay una ingesta en curso")
+        state = pipeline.new_run(stages, _runs_dir())
+        _spawn(state["id"])
+    return state
+
+
+def resume_run(run_id: str) -> Optional[dict]:
+    with _ingestion_lock():
+        state = get_run(run_id)
+        if state is None:
+            return None
+        if state["status"] == pipeline.SUCCEEDED or state["runner_alive"]:
+            raise IngestionConflict(f"La ingesta {run_id} no se puede reanudar (estado: {state['status']})")
+        if _active_runs():
+            raise IngestionConflict("Ya hay una ingesta en curso")
+        _spawn(run_id)
+    return state
+
+
+def cancel_run(run_id: str) -> Optional[dict]:
+    """Cancela una ingesta en curso; solo se envía SIGTERM a un runner que se ha comprobado vivo"""
+    state = get_run(run_id)
+    if state is None:
+        return None
+    if not state["runner_alive"]:
+        raise IngestionConflict(f"La ingesta {run_id} no está en curso (estado: {state['status']})")
+    pid = _runner_pid(state)
+    pipeline.request_cancel(run_id, _runs_dir())
+    process = _processes.get(pid)
+    try:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass
+    return get_run(run_id)
+
+
+def run_log_path(run_id: str) -> Optional[str]:
+    path = os.path.join(_runs_dir(), run_id, "pipeline.log")
+    return path if os.path.exists(path) else None
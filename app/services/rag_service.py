@@ -0,0 +1,323 @@
+﻿# app/services/rag_service.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+import anyio
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import CANCELLED_WORK, UPSTREAM_ERRORS, cache_stats, observe_stage, track_stage
+from app.services.single_flight import SingleFlight, digest, normalize_question
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """Eres un asistente experto en la UPC (Universitat Politècnica de Catalunya).
+Tu tarea es responder preguntas utilizando ÚNICAMENTE la información proporcionada en el contexto.
+Si la información no está en el contexto, indica que no tienes esa información.
+No inventes ni añadas información que no esté en el contexto proporcionado."""
+
+WARM_UP_QUESTION = "Horari de la secretaria de la FIB"
+
+
+class RetrievalCancelled(Exception):
+    """La petición que esperaba la búsqueda se ha abandonado"""
+
+
+def _check_cancelled(cancelled: Optional[threading.Event]):
+    if cancelled is not None and cancelled.is_set():
+        raise RetrievalCancelled()
+
+
+class RagService:
+    """
+    Conecta el chatbot con el índice de LLM/: expansión de la pregunta con el
+    diccionario semántico, búsqueda en ChromaDB y generación con la API local
+    compatible con OpenAI (LM Studio).
+
+    Todo se carga una sola vez al arrancar la aplicación, con `load` o paso a
+    paso desde el calentamiento de app/services/readiness.py.
+    """
+
+    def __init__(self):
+        self.expander = None
+        self.encoder = None
+        self.collection = None
+        self.reranker = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.index_name = None
+        self._aliases_seen = None
+        self._aliases_checked_at = 0.0
+        # Preguntas idénticas en curso (p. ej. tras un aviso) comparten búsqueda y generación
+        self.retrievals = SingleFlight("retrieval")
+        self.generations = SingleFlight("generation")
+
+    @property
+    def enabled(self):
+        return settings.RAG_ENABLED and self.collection is not None
+
+    def load(self):
+        self.load_dictionary()
+        if settings.RAG_ENABLED:
+            self.load_models()
+            self.open_index()
+            self.open_client()
+
+    def resolve_index(self):
+        """Directorio de la versión activa del índice y metadatos de su publicación (LLM/index_versions.py)"""
+        from LLM.index_versions import resolve
+
+        return resolve(settings.CHROMA_PATH, settings.CHROMA_COLLECTION)
+
+    def load_dictionary(self, publication=None):
+        from LLM.query_expansion import QueryExpander
+
+        if publication is None:
+            _, publication = self.resolve_index()
+        prefix = publication.get("dictionary_prefix") or settings.DICTIONARY_PREFIX
+        self.expander = QueryExpander.load(prefix) or (self.expander if publication else None)
+        if self.expander is None:
+            logger.warning("Diccionario semántico %s_diccionario.json no encontrado: "
+                           "las preguntas no se expandirán", prefix)
+        return self.expander is not None
+
+    def load_models(self):
+        from LLM.embedding_backends import load_backend
+        from LLM.embedding_batcher import EmbeddingBatcher
+        from LLM.embedding_cache import QueryEmbeddingCache
+
+        backend = load_backend(model_name=settings.EMBEDDING_MODEL_NAME)
+        self.encoder = QueryEmbeddingCache(
+            EmbeddingBatcher(backend),
+            model_name=f"{settings.EMBEDDING_MODEL_NAME}:{backend.name}"
+        )
+        cache_stats.register("query_embedding", lambda: (self.encoder.hits, self.encoder.misses))
+        if settings.RERANKER_ENABLED:
+            from LLM.reranker import CrossEncoderReranker
+
+            self.reranker = CrossEncoderReranker(token_budget=settings.RERANKER_TOKEN_BUDGET)
+
+    def _aliases_mtime(self):
+        from LLM.index_versions import ALIASES_FILE
+
+        try:
+            return os.stat(os.path.join(settings.CHROMA_PATH, ALIASES_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def open_index(self):
+        import chromadb
+
+        mtime = self._aliases_mtime()
+        path, publication = self.resolve_index()
+        # La asignación final es atómica: las búsquedas en curso terminan con la colección anterior
+        self.collection = chromadb.PersistentClient(path=path).get_collection(name=settings.CHROMA_COLLECTION)
+        self.index_name = os.path.basename(os.path.normpath(path))
+        self._aliases_seen = mtime
+        return publication
+
+    def reload_index_if_published(self):
+        """Cambia a la versión nueva cuando se mueve el alias de la colección (se comprueba cada pocos segundos)"""
+        now = time.monotonic()
+        if now - self._aliases_checked_at < settings.INDEX_RELOAD_SECONDS:
+            return
+        self._aliases_checked_at = now
+        mtime = self._aliases_mtime()
+        if mtime is None or mtime == self._aliases_seen:
+            return
+
+        try:
+            publication = self.open_index()
+            self.load_dictionary(publication)
+            logger.info("Versión %s del índice activada", self.index_name)
+        except Exception as e:
+            # Se sigue sirviendo con la versión anterior
+            self._aliases_seen = mtime
+            logger.error("No se ha podido activar la versión publicada del índice: %s", e)
+
+    def open_client(self):
+        self.client = httpx.AsyncClient(timeout=settings.LLM_TIMEOUT_SECONDS)
+
+    def warm_up_models(self):
+        """Primera inferencia de los modelos (sin pasar por la caché) para no cargarla a un usuario"""
+        embedding = self.encoder.encoder.encode([WARM_UP_QUESTION])[0]
+        if self.reranker is not None:
+            self.reranker.rerank(WARM_UP_QUESTION, [WARM_UP_QUESTION], [{}])
+        return embedding
+
+    def warm_up_index(self):
+        """Búsqueda de prueba: abre los segmentos del índice y comprueba que no está vacío"""
+        embedding = self.encoder.encoder.encode([WARM_UP_QUESTION])[0]
+        documents, _ = self._search(embedding.tolist(), 1)
+        if not documents:
+            raise RuntimeError(f"La colección {settings.CHROMA_COLLECTION} está vacía")
+
+    async def check_llm(self):
+        """Comprueba que la API del modelo responde (GET /v1/models)"""
+        models_url = settings.LLM_API_URL.rsplit("/chat/completions", 1)[0] + "/models"
+        response = await self.client.get(models_url, timeout=5.0)
+        response.raise_for_status()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+        if self.encoder is not None:
+            self.encoder.encoder.close()
+
+    def expand(self, question: str):
+        """Añade a la pregunta las definiciones de sus acrónimos y los términos relacionados"""
+        if self.expander is None:
+            return None
+        return self.expander.expand(question)
+
+    def retrieve(self, question: str, cancelled: Optional[threading.Event] = None) -> str:
+        """
+        Busca los fragmentos más relevantes para la pregunta y los devuelve como contexto.
+
+        Si se activa `cancelled`, la búsqueda se detiene antes de la siguiente
+        etapa (embedding, búsqueda vectorial o reranking).
+        """
+        _check_cancelled(cancelled)
+        self.reload_index_if_published()
+        expansion = self.expand(question)
+        query_text = expansion.text if expansion else question
+        # Con los acrónimos ya resueltos la búsqueda es más precisa y bastan menos fragmentos
+        top_k = settings.RAG_TOP_K_EXPANDED if expansion and expansion.definitions else settings.RAG_TOP_K
+
+        try:
+            with track_stage("embedding"):
+                query_embedding = self.encoder.encode([query_text])[0].tolist()
+        except Exception:
+            UPSTREAM_ERRORS.labels(upstream="embedding").inc()
+            raise
+
+        _check_cancelled(cancelled)
+        if self.reranker is not None:
+            with self.reranker.depth.acquire() as depth:
+                documents, metadatas = self._search(query_embedding, max(depth, top_k))
+                _check_cancelled(cancelled)
+                with track_stage("rerank"):
+                    ranked = self.reranker.rerank(question, documents, metadatas)
+            documents = [doc for doc, _, _ in ranked]
+            metadatas = [metadata for _, metadata, _ in ranked]
+        else:
+            documents, metadatas = self._search(query_embedding, top_k)
+
+        parts = []
+        for i, (doc, metadata) in enumerate(zip(documents, metadatas)):
+            source = metadata.get("source", "Desconocido")
+            if metadata.get("section"):
+                source += f" ({metadata['section']})"
+            parts.append(f"[Fragmento {i + 1} - Fuente: {source}]\n{doc}")
+        return "\n\n".join(parts)
+
+    def _search(self, query_embedding, n_results):
+        try:
+            with track_stage("vector_search"):
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_results,
+                    include=["documents", "metadatas"]
+                )
+        except Exception:
+            UPSTREAM_ERRORS.labels(upstream="vector_store").inc()
+            raise
+        if not results["documents"] or not results["documents"][0]:
+            return [], []
+        return results["documents"][0], results["metadatas"][0]
+
+    def build_messages(self, question: str, context: str, history: List) -> List[dict]:
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        # El último mensaje del historial es la propia pregunta
+        for message in history[:-1]:
+            messages.append({"role": "user" if message.is_user else "assistant", "content": message.content})
+        messages.append({
+            "role": "user",
+            "content": f"CONTEXTO:\n{context or 'Sin información relevante.'}\n\nPREGUNTA:\n{question}"
+        })
+        return messages
+
+    async def stream(self, messages: List[dict]):
+        """Genera los fragmentos de texto de la respuesta a medida que llegan del modelo (SSE)"""
+        start = time.perf_counter()
+        first_token = True
+        try:
+            async with self.client.stream("POST", settings.LLM_API_URL, json={
+                "model": settings.LLM_MODEL,
+                "messages": messages,
+                "max_tokens": 800,
+                "temperature": 0.5,
+                "stream": True
+            }) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if not delta:
+                        continue
+                    if first_token:
+                        observe_stage("llm_first_token", time.perf_counter() - start)
+                        first_token = False
+                    yield delta
+        except (httpx.HTTPError, ValueError, KeyError):
+            UPSTREAM_ERRORS.labels(upstream="llm").inc()
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # Al salir del `async with` se cierra la conexión y el servidor deja de generar
+            CANCELLED_WORK.labels(stage="llm").inc()
+            raise
+        observe_stage("llm_total", time.perf_counter() - start)
+
+    async def generate(self, messages: List[dict]) -> str:
+        return "".join([delta async for delta in self.stream(messages)])
+
+    async def retrieve_async(self, question: str) -> str:
+        """
+        `retrieve` en el pool de hilos. Si la tarea se cancela mientras espera
+        un hilo libre, la búsqueda ya no se ejecuta; si ya ha empezado, se
+        detiene en la siguiente etapa.
+        """
+        cancelled = threading.Event()
+        try:
+            return await anyio.to_thread.run_sync(self.retrieve, question, cancelled, abandon_on_cancel=True)
+        except asyncio.CancelledError:
+            cancelled.set()
+            CANCELLED_WORK.labels(stage="retrieval").inc()
+            raise
+
+    async def retrieve_shared(self, question: str) -> str:
+        """`retrieve` compartido entre las peticiones concurrentes con la misma pregunta normalizada"""
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await self.retrieve_async(question)
+        return await self.retrievals.do(normalize_question(question), lambda: self.retrieve_async(question))
+
+    def answer_stream(self, question: str, context: str, history: List):
+        """
+        Stream de la respuesta, compartido entre las peticiones concurrentes con
+        la misma pregunta normalizada, el mismo contexto recuperado y el mismo
+        historial (la respuesta depende de los tres).
+        """
+        messages = self.build_messages(question, context, history)
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return self.stream(messages)
+        key = (
+            normalize_question(question),
+            digest(context),
+            digest(*(f"{message.is_user}:{message.content}" for message in history[:-1]))
+        )
+        return self.generations.stream(key, lambda: self.stream(messages))
+
+    async def answer(self, question: str, history: List) -> str:
+        context = await self.retrieve_shared(question)
+        return "".join([delta async for delta in self.answer_stream(question, context, history)])
+
+
+rag_service = RagService()
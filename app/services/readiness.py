@@ -0,0 +1,161 @@
+﻿# app/services/readiness.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.database import engine
+from app.services.rag_service import rag_service
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Estado de las dependencias del worker tras el calentamiento.
+
+    Cada comprobación guarda su estado ("pending", "ok", "error" o "skipped"),
+    su duración, el error si lo hubo y cuántas veces se ha intentado. El worker
+    está listo cuando todas las comprobaciones obligatorias están en "ok" o
+    "skipped"; las que fallan se reintentan en segundo plano (`keep_ready`).
+    """
+
+    def __init__(self):
+        self.checks = OrderedDict()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def reset(self, names=()):
+        """Empieza un calentamiento nuevo, con `names` pendientes hasta que se ejecuten"""
+        self.checks.clear()
+        for name in names:
+            self.checks[name] = {"status": "pending", "required": True, "duration_ms": None,
+                                 "detail": None, "attempts": 0}
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+
+    def skip(self, name: str, reason: str):
+        self.checks[name] = {"status": "skipped", "required": False, "duration_ms": 0.0, "detail": reason,
+                             "attempts": 0}
+
+    def fail(self, name: str, reason: str):
+        previous = self.checks.get(name, {})
+        self.checks[name] = {"status": "error", "required": True, "duration_ms": 0.0, "detail": reason,
+                             "attempts": previous.get("attempts", 0)}
+
+    async def run(self, name: str, check: Callable, required: bool = True):
+        """Ejecuta una comprobación (síncrona en el threadpool o asíncrona) y anota el resultado"""
+        attempts = self.checks.get(name, {}).get("attempts", 0) + 1
+        self.checks[name] = {"status": "pending", "required": required, "duration_ms": None, "detail": None,
+                             "attempts": attempts}
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(check):
+                await check()
+            else:
+                await run_in_threadpool(check)
+            self.checks[name]["status"] = "ok"
+        except Exception as e:
+            logger.warning("Calentamiento: la comprobación %s ha fallado: %s", name, e)
+            self.checks[name]["status"] = "error"
+            self.checks[name]["detail"] = str(e)
+        self.checks[name]["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return self.checks[name]["status"] == "ok"
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None and all(
+            check["status"] in ("ok", "skipped") for check in self.checks.values() if check["required"]
+        )
+
+    def failed(self):
+        return [name for name, check in self.checks.items() if check["required"] and check["status"] == "error"]
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warm_up_ms": round((self.finished_at - self.started_at) * 1000, 3) if self.finished_at else None,
+            "checks": self.checks
+        }
+
+
+readiness = Readiness()
+
+
+def check_database():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def load_dictionary():
+    if not rag_service.load_dictionary():
+        raise FileNotFoundError(f"{settings.DICTIONARY_PREFIX}_diccionario.json no encontrado")
+
+
+def load_models():
+    rag_service.load_models()
+    rag_service.warm_up_models()
+
+
+def open_index():
+    rag_service.open_index()
+    rag_service.warm_up_index()
+
+
+async def _load_rag(models: bool = True):
+    if not models or await readiness.run("models", load_models):
+        await readiness.run("vector_store", open_index)
+    else:
+        readiness.fail("vector_store", "Los modelos de embeddings no se han cargado")
+
+
+async def warm_up():
+    """Carga y calienta las dependencias del worker"""
+    readiness.reset(["database", "dictionary", "models", "vector_store", "llm"])
+    await readiness.run("database", check_database)
+    await readiness.run("dictionary", load_dictionary, required=False)
+
+    if settings.RAG_ENABLED:
+        rag_service.open_client()
+        await _load_rag()
+        await readiness.run("llm", rag_service.check_llm)
+    else:
+        for name in ("models", "vector_store", "llm"):
+            readiness.skip(name, "RAG_ENABLED desactivado")
+
+    readiness.finished_at = time.perf_counter()
+    logger.info("Calentamiento terminado en %.0f ms (listo: %s)",
+                (readiness.finished_at - readiness.started_at) * 1000, readiness.ready)
+
+
+async def retry_failed():
+    """Vuelve a ejecutar las comprobaciones obligatorias que han fallado (y las que dependen de ellas)"""
+    failed = set(readiness.failed())
+    if "database" in failed:
+        await readiness.run("database", check_database)
+    if "models" in failed or "vector_store" in failed:
+        await _load_rag(models="models" in failed)
+    if "llm" in failed:
+        await readiness.run("llm", rag_service.check_llm)
+
+
+async def keep_ready():
+    """
+    Calentamiento en segundo plano: la aplicación acepta peticiones desde el
+    principio y /ready informa del progreso (503 mientras no esté listo). Si
+    una dependencia obligatoria no responde (p. ej. el LLM o el índice al
+    arrancar), se reintenta con backoff exponencial hasta que se recupera.
+    """
+    await warm_up()
+    delay = settings.READINESS_RETRY_SECONDS
+    while not readiness.ready:
+        await asyncio.sleep(delay)
+        await retry_failed()
+        delay = min(delay * 2, settings.READINESS_RETRY_MAX_SECONDS)
+        if readiness.ready:
+            logger.info("Dependencias recuperadas: el worker ya está listo")
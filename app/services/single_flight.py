@@ -0,0 +1,160 @@
+﻿# app/services/single_flight.py
+import asyncio
+import hashlib
+import re
+import unicodedata
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from app.core.metrics import cache_stats
+
+
+def normalize_question(question: str) -> str:
+    """Forma canónica de una pregunta: sin diferencias de mayúsculas, espacios ni signos finales"""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip("¿?¡!.,;: ")
+
+
+def digest(*parts: str) -> str:
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(part.encode("utf-8"))
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+class Flight:
+    """
+    Una generación en curso compartida por varias peticiones.
+
+    Los fragmentos se guardan a medida que llegan, así quien se une tarde
+    recibe primero lo ya generado y después sigue el stream en directo. Si
+    todas las peticiones suscritas la abandonan, se llama a `on_abandon` y la
+    generación se cancela.
+    """
+
+    def __init__(self, on_abandon: Optional[Callable[[], None]] = None):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.on_abandon = on_abandon
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Cada espera usa el evento vigente al empezar a esperar
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        try:
+            while True:
+                while position < len(self.chunks):
+                    yield self.chunks[position]
+                    position += 1
+                if self.done:
+                    break
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.task is not None:
+                if self.on_abandon is not None:
+                    self.on_abandon()
+                self.task.cancel()
+        if self.error is not None:
+            raise self.error
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Agrupa las llamadas concurrentes con la misma clave en una sola ejecución.
+
+    La ejecución corre en su propia tarea: si una de las peticiones que la
+    esperan se cancela, las demás siguen recibiendo el resultado, y solo
+    cuando la abandonan todas se cancela la ejecución. Al terminar
+    la clave se libera, así que no hace de caché: solo se comparte el trabajo
+    que está en curso. Las llamadas que se unen a otra cuentan como aciertos en
+    /metrics (`chatbot_cache_hits_total{cache="single_flight_<nombre>"}`).
+    """
+
+    def __init__(self, name: str):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._flights: Dict[Hashable, Flight] = {}
+        self.shared = 0
+        self.started = 0
+        cache_stats.register(f"single_flight_{name}", lambda: (self.shared, self.started))
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Devuelve el resultado de `fn()`, ejecutándola solo si no hay otra con la misma clave en curso"""
+        call = self._calls.get(key)
+        if call is None:
+            self.started += 1
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._release(self._calls, key, call))
+        else:
+            self.shared += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Quien llegue a partir de ahora empieza una ejecución nueva en vez
+                # de unirse a una que ya está cancelada
+                self._release(self._calls, key, call)
+                call.task.cancel()
+
+    @staticmethod
+    def _release(registry: Dict[Hashable, object], key: Hashable, entry: object):
+        # La clave puede pertenecer ya a una ejecución más reciente
+        if registry.get(key) is entry:
+            del registry[key]
+
+    def stream(self, key: Hashable, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Fragmentos del stream de `fn()`, compartido con las llamadas con la misma clave en curso"""
+        flight = self._flights.get(key)
+        if flight is None:
+            self.started += 1
+            # Abandonada, la clave se libera enseguida: quien llegue después no
+            # se une a una generación que ya se está cancelando
+            flight = Flight(on_abandon=lambda: self._release(self._flights, key, flight))
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(self._run(key, flight, fn))
+        else:
+            self.shared += 1
+        flight.subscribers += 1
+        return flight.subscribe()
+
+    async def _run(self, key: Hashable, flight: Flight, fn: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in fn():
+                flight.publish(chunk)
+        except asyncio.CancelledError as e:
+            flight.finish(e)
+            raise
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            self._release(self._flights, key, flight)
@@ -0,0 +1,144 @@
+"""
+Serialización y transferencia de una conversación larga.
+
+Crea en una base de datos SQLite temporal una conversación con `--messages`
+mensajes y compara, para `GET /api/v1/conversations/{id}`:
+
+- antes: objetos ORM validados con `ConversationResponse` (from_attributes),
+  volcados a tipos JSON por pydantic y codificados con `json.dumps`, que es lo
+  que hace FastAPI con `response_model` y JSONResponse;
+- después: columnas leídas como tuplas y codificadas con orjson.
+
+También muestra el tamaño del cuerpo con y sin gzip y el tiempo de
+transferencia estimado para el ancho de banda indicado, y mide la petición
+completa con TestClient con y sin `Accept-Encoding: gzip`.
+
+Uso: python benchmarks/serialization.py [--messages 1000] [--runs 20] [--mbps 10]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ("la matrícula del cuatrimestre de primavera se hace en la secretaría de la FIB "
+         "consulta el calendario académico las normativas y los horarios de las asignaturas "
+         "del grado en ingeniería informática y de los másteres de la UPC").split()
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def median_ms(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--mbps", type=float, default=10.0, help="Ancho de banda para estimar la transferencia")
+    args = parser.parse_args()
+
+    # La base de datos se elige al importar la aplicación
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    import orjson
+    from fastapi.testclient import TestClient
+    from pydantic import TypeAdapter
+
+    from app.api.endpoints.conversations import rows_as_dicts
+    from app.core.config import settings
+    from app.core.schemas import ConversationResponse
+    from app.core.security import create_access_token, get_password_hash
+    from app.db.database import Base, SessionLocal, engine
+    from app.db.models import Conversation, Message, User
+    from main import app
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(username="benchmark", email="benchmark@fib.upc.edu", hashed_password=get_password_hash("benchmark"))
+    conversation = Conversation(title="Conversación larga", user=user)
+    db.add(conversation)
+    db.flush()
+    rng = random.Random(0)
+    start = datetime.utcnow() - timedelta(days=1)
+    db.add_all([
+        Message(
+            conversation_id=conversation.id,
+            is_user=i % 2 == 0,
+            # Preguntas cortas y respuestas de varias frases, como en el chat
+            content=sentence(rng, 15) if i % 2 == 0 else " ".join(sentence(rng, 20) for _ in range(5)),
+            timestamp=start + timedelta(seconds=i)
+        )
+        for i in range(args.messages)
+    ])
+    db.commit()
+    conversation_id = conversation.id
+    adapter = TypeAdapter(ConversationResponse)
+
+    def before():
+        session = SessionLocal()
+        try:
+            orm = session.query(Conversation).filter(Conversation.id == conversation_id).first()
+            content = adapter.dump_python(adapter.validate_python(orm, from_attributes=True), mode="json")
+            return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                              separators=(",", ":")).encode("utf-8")
+        finally:
+            session.close()
+
+    def after():
+        session = SessionLocal()
+        try:
+            row = session.query(
+                Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at
+            ).filter(Conversation.id == conversation_id).first()
+            messages = session.query(
+                Message.id, Message.content, Message.is_user, Message.timestamp
+            ).filter(Message.conversation_id == conversation_id).order_by(Message.timestamp, Message.id)
+            return orjson.dumps({**row._asdict(), "messages": rows_as_dicts(messages)})
+        finally:
+            session.close()
+
+    assert json.loads(before()) == json.loads(after()), "Las dos versiones deben devolver el mismo JSON"
+
+    body = after()
+    compressed = gzip.compress(body, compresslevel=settings.GZIP_COMPRESSLEVEL)
+    bytes_per_ms = args.mbps * 1e6 / 8 / 1000
+
+    print(f"Conversación de {args.messages} mensajes (mediana de {args.runs} ejecuciones)")
+    print(f"{'':<34}{'antes':>12}{'después':>12}")
+    print(f"{'carga + serialización (ms)':<34}{median_ms(before, args.runs):>12.1f}{median_ms(after, args.runs):>12.1f}")
+    print(f"{'tamaño del cuerpo (KiB)':<34}{len(body) / 1024:>12.1f}{len(compressed) / 1024:>12.1f}")
+    print(f"{f'transferencia a {args.mbps:g} Mbit/s (ms)':<34}"
+          f"{len(body) / bytes_per_ms:>12.1f}{len(compressed) / bytes_per_ms:>12.1f}")
+
+    token = create_access_token(user.username)
+    url = f"/api/v1/conversations/{conversation_id}"
+    with TestClient(app) as client:
+        for encoding in ("identity", "gzip"):
+            headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": encoding}
+            response = client.get(url, headers=headers)
+            elapsed = median_ms(lambda: client.get(url, headers=headers), args.runs)
+            size = int(response.headers.get("content-length", len(response.content)))
+            print(f"GET {url} ({encoding}): {elapsed:.1f} ms, {size / 1024:.1f} KiB")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Tiempo de importación de la aplicación y de los módulos de LLM/.
+
+Cada módulo se importa en un proceso nuevo varias veces y se resta el tiempo
+de arranque del intérprete, de modo que el resultado es lo que cuesta
+`import modulo` (incluidos sus efectos secundarios). Los módulos que no se
+pueden importar (dependencias no instaladas) se muestran con el error.
+
+Uso: python benchmarks/startup_time.py [--runs 5] [modulo ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LLM_DIR = os.path.join(ROOT, "LLM")
+
+# módulo -> directorio desde el que se importa (los scripts de LLM/ se importan entre sí como hermanos)
+TARGETS = {
+    "main": ROOT,
+    "markdown_analyzer": LLM_DIR,
+    "markdown_indexer": LLM_DIR,
+    "prepareEmbeddingsForDictionary": LLM_DIR,
+    "scrapper": LLM_DIR,
+    "ocr": LLM_DIR,
+    "chunks": LLM_DIR,
+    "embedding_backends": LLM_DIR,
+    "reranker": LLM_DIR,
+    "query_expansion": LLM_DIR,
+}
+
+
+def time_import(statement, cwd, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", statement],
+            cwd=cwd, capture_output=True, text=True, timeout=300
+        )
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        timings.append(elapsed)
+    return statistics.median(timings), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=list(TARGETS))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline, _ = time_import("pass", ROOT, args.runs)
+    print(f"Arranque del intérprete: {baseline * 1000:.0f} ms (restado a cada módulo)")
+    print(f"{'módulo':<32}{'import (ms)':>12}")
+    for module in args.modules:
+        elapsed, error = time_import(f"import {module}", TARGETS.get(module, ROOT), args.runs)
+        if error:
+            print(f"{module:<32}{'error':>12}  {error}")
+        else:
+            print(f"{module:<32}{(elapsed - baseline) * 1000:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
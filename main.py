@@ -1,18 +1,40 @@
-﻿import uvicorn
-from fastapi.responses import FileResponse
-from fastapi import FastAPI
+﻿import asyncio
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.api import api_router
 from app.core.config import settings
+from app.core.metrics import render_metrics
+from app.core.profiling import ProfilingMiddleware, instrument_engine
 from app.db.database import Base, engine
+from app.services.rag_service import rag_service
+from app.services.readiness import keep_ready, readiness
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    Base.metadata.create_all(bind=engine)
+    # Cargar y calentar modelos, índice y conexiones en segundo plano; /ready devuelve 503 hasta terminar
+    warm_up_task = asyncio.create_task(keep_ready())
+    yield
+    warm_up_task.cancel()
+    await rag_service.close()
+
 
 # Inicializar la aplicación FastAPI
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description=settings.PROJECT_DESCRIPTION,
-    version=settings.VERSION
+    version=settings.VERSION,
+    lifespan=lifespan,
+    # orjson serializa bastante más rápido que json las conversaciones largas
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS
@@ -24,9 +46,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(api_router, prefix=settings.API_V1_STR)
+# Comprimir las respuestas grandes (historiales de conversación) si el cliente lo admite; a partir
+# del nivel 6 el tamaño apenas baja y el tiempo de CPU se multiplica
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    compresslevel=settings.GZIP_COMPRESSLEVEL
+)
+
+# Perfilado bajo demanda (cabecera X-Profile con X-Admin-Token) o de una muestra de peticiones
+if settings.PROFILING_ENABLED:
+    instrument_engine(engine)
+    app.add_middleware(
+        ProfilingMiddleware,
+        sample_rate=settings.PROFILING_SAMPLE_RATE,
+        directory=settings.PROFILE_DIR,
+        max_profiles=settings.PROFILE_MAX_FILES
+    )
 
-Base.metadata.create_all(bind=engine)
+app.include_router(api_router, prefix=settings.API_V1_STR)
 
 # Montar archivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -39,6 +77,16 @@ async def root():
 async def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """Estado de cada dependencia y tiempos de calentamiento; 503 hasta que el worker está listo"""
+    return JSONResponse(status_code=200 if readiness.ready else 503, content=readiness.report())
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 
 # Ejecutar la aplicación con uvicorn
 if __name__ == "__main__":
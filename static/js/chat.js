@@ -14,6 +14,13 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentConversationId = null;
     let token = localStorage.getItem('token');
 
+    // Canal WebSocket: una autenticación por conexión y respuestas token a token
+    let socket = null;
+    let socketReady = null;
+    let requestCounter = 0;
+    let activeRequestId = null;
+    const pendingRequests = new Map();
+
     // Comprueba si el usuario está autenticado
     function checkAuth() {
         if (!token) {
@@ -158,6 +165,87 @@ document.addEventListener('DOMContentLoaded', function() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
+    // Abre (o reutiliza) la conexión WebSocket autenticada
+    function connectSocket() {
+        if (socketReady) return socketReady;
+
+        socketReady = new Promise((resolve, reject) => {
+            const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+            const ws = new WebSocket(`${protocol}://${window.location.host}/api/v1/chat/ws`);
+
+            ws.onopen = () => ws.send(JSON.stringify({ type: 'auth', token: token }));
+
+            ws.onmessage = event => {
+                const data = JSON.parse(event.data);
+                if (data.type === 'ready') {
+                    socket = ws;
+                    resolve(ws);
+                    return;
+                }
+                const request = pendingRequests.get(data.id);
+                if (!request) return;
+                if (data.type === 'start') {
+                    request.onStart(data.conversation_id);
+                } else if (data.type === 'token') {
+                    request.onToken(data.delta);
+                } else {
+                    pendingRequests.delete(data.id);
+                    if (data.type === 'done') {
+                        request.resolve(data);
+                    } else {
+                        request.reject(new Error(data.detail || 'Generación cancelada'));
+                    }
+                }
+            };
+
+            ws.onclose = () => {
+                socket = null;
+                socketReady = null;
+                reject(new Error('WebSocket cerrado'));
+                pendingRequests.forEach(request => request.reject(new Error('WebSocket cerrado')));
+                pendingRequests.clear();
+            };
+        });
+        return socketReady;
+    }
+
+    // Envía la pregunta por el WebSocket y va mostrando la respuesta a medida que llega
+    async function sendOverSocket(message, conversationId, onStart, onToken) {
+        const ws = await connectSocket();
+        const id = String(++requestCounter);
+        activeRequestId = id;
+        return new Promise((resolve, reject) => {
+            pendingRequests.set(id, { onStart, onToken, resolve, reject });
+            ws.send(JSON.stringify({ type: 'message', id: id, conversation_id: conversationId, message: message }));
+        }).finally(() => {
+            if (activeRequestId === id) activeRequestId = null;
+        });
+    }
+
+    // Cancela la pregunta en curso (tecla Escape)
+    function cancelActiveRequest() {
+        if (socket && activeRequestId) {
+            socket.send(JSON.stringify({ type: 'cancel', id: activeRequestId }));
+        }
+    }
+
+    // Envía la pregunta con una petición HTTP (si el WebSocket no está disponible)
+    async function sendOverHttp(message, conversationId) {
+        const response = await fetch('/api/v1/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({
+                message: message,
+                conversation_id: conversationId
+            })
+        });
+        if (!response.ok) throw new Error(`Error HTTP ${response.status}`);
+        return response.json();
+    }
+
     // Envía un mensaje al chatbot
     async function sendMessage() {
         const message = messageInput.value.trim();
@@ -181,41 +269,46 @@ document.addEventListener('DOMContentLoaded', function() {
         chatMessages.appendChild(userMessageElement);
         chatMessages.scrollTop = chatMessages.scrollHeight;
 
-        try {
-            const response = await fetch('/api/v1/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`
-                },
-                body: JSON.stringify({
-                    message: message,
-                    conversation_id: currentConversationId
-                })
-            });
-
-            if (response.ok) {
-                const data = await response.json();
-
-                // Si es una nueva conversación, actualiza el ID y recarga la lista
-                if (currentConversationId !== data.conversation_id) {
-                    currentConversationId = data.conversation_id;
-                    loadConversations();
-                }
-
-                // Añade la respuesta del bot
-                const botMessageElement = document.createElement('div');
-                botMessageElement.classList.add('message', 'bot-message');
+        // Añade la respuesta del bot, que se irá completando
+        const botMessageElement = document.createElement('div');
+        botMessageElement.classList.add('message', 'bot-message');
+        botMessageElement.innerHTML = `
+            <div class="message-content"></div>
+            <div class="message-time">${formattedTime}</div>
+        `;
+        const botContent = botMessageElement.querySelector('.message-content');
+        chatMessages.appendChild(botMessageElement);
 
-                botMessageElement.innerHTML = `
-                    <div class="message-content">${data.response}</div>
-                    <div class="message-time">${formattedTime}</div>
-                `;
+        const conversationId = currentConversationId;
+        let data;
+        let streamed = '';
+        let started = false;
+        try {
+            try {
+                data = await sendOverSocket(message, conversationId, newConversationId => {
+                    started = true;
+                    if (currentConversationId === conversationId) currentConversationId = newConversationId;
+                }, delta => {
+                    streamed += delta;
+                    botContent.textContent = streamed;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                });
+            } catch (error) {
+                // Sin WebSocket (proxy, red...) se usa la petición HTTP de siempre
+                if (started || error.message !== 'WebSocket cerrado') throw error;
+                data = await sendOverHttp(message, conversationId);
+            }
 
-                chatMessages.appendChild(botMessageElement);
-                chatMessages.scrollTop = chatMessages.scrollHeight;
+            // Si es una nueva conversación, actualiza el ID y recarga la lista
+            if (conversationId !== data.conversation_id) {
+                if (currentConversationId === conversationId) currentConversationId = data.conversation_id;
+                loadConversations();
             }
+
+            botContent.innerHTML = data.response;
+            chatMessages.scrollTop = chatMessages.scrollHeight;
         } catch (error) {
+            if (!streamed) botMessageElement.remove();
             console.error('Error al enviar mensaje:', error);
         }
     }
@@ -308,6 +401,8 @@ document.addEventListener('DOMContentLoaded', function() {
         if (e.key === 'Enter' && !e.shiftKey) {
             e.preventDefault();
             sendMessage();
+        } else if (e.key === 'Escape') {
+            cancelActiveRequest();
         }
     });
 
@@ -349,6 +444,7 @@ document.addEventListener('DOMContentLoaded', function() {
     logoutButton.addEventListener('click', function() {
         localStorage.removeItem('token');
         token = null;
+        if (socket) socket.close();
         checkAuth();
     });
 
@@ -0,0 +1,95 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# chat_service importa el motor de la base de datos; el test no llega a usarlo
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.services import chat_service  # noqa: E402
+from app.services.context_cache import CachedMessage, ConversationContextCache  # noqa: E402
+
+START = datetime(2025, 1, 1)
+
+
+def message(i, conversation_id=1):
+    return CachedMessage(id=i, content=f"mensaje {i} de {conversation_id}", is_user=i % 2 == 0,
+                         timestamp=START + timedelta(seconds=i))
+
+
+class FakeSession:
+    """Lo justo de una sesión de SQLAlchemy para get_conversation_context, contando las lecturas"""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.reads = 0
+
+    def query(self, model):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def order_by(self, *criteria):
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def all(self):
+        self.reads += 1
+        return list(reversed(self.messages))[:self._limit]
+
+
+def test_least_recently_used_conversation_is_evicted():
+    cache = ConversationContextCache(max_conversations=2, window_size=5)
+    cache.set(1, [message(1, 1)])
+    cache.set(2, [message(1, 2)])
+    assert cache.get(1, 5) is not None  # la 1 pasa a ser la más reciente
+
+    cache.set(3, [message(1, 3)])
+
+    assert len(cache) == 2
+    assert cache.get(2, 5) is None
+    assert cache.get(1, 5) == [message(1, 1)]
+    assert cache.get(3, 5) == [message(1, 3)]
+
+
+def test_version_mismatch_is_a_miss():
+    cache = ConversationContextCache(window_size=5)
+    cache.set(1, [message(1)], version="v1")
+
+    assert cache.get(1, 5, version="v1") == [message(1)]
+    assert cache.get(1, 5, version="v2") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_append_only_updates_cached_conversations():
+    cache = ConversationContextCache(window_size=3)
+    cache.append(1, message(1))
+    assert len(cache) == 0 and cache.get(1, 3) is None
+
+    cache.set(1, [message(1), message(2)])
+    cache.append(1, message(3))
+    cache.append(1, message(4))
+
+    # La ventana se queda con los `window_size` mensajes más recientes
+    assert cache.get(1, 3) == [message(2), message(3), message(4)]
+    assert cache.get(1, 2) == [message(3), message(4)]
+
+
+def test_context_is_read_again_when_another_worker_changed_the_conversation(monkeypatch):
+    monkeypatch.setattr(chat_service, "context_cache", ConversationContextCache(window_size=10))
+    db = FakeSession([message(i) for i in range(1, 5)])
+
+    first = chat_service.get_conversation_context(db, 1, max_messages=3, version="v1")
+    again = chat_service.get_conversation_context(db, 1, max_messages=3, version="v1")
+    assert first == again == [message(2), message(3), message(4)]
+    assert db.reads == 1
+
+    # Otro worker ha guardado un mensaje: cambia la versión y hay que volver a la base de datos
+    db.messages.append(message(5))
+    updated = chat_service.get_conversation_context(db, 1, max_messages=3, version="v2")
+    assert updated == [message(3), message(4), message(5)]
+    assert db.reads == 2
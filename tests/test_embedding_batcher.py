@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LLM"))
+
+from embedding_batcher import EmbeddingBatcher  # noqa: E402
+
+
+class RecordingModel:
+    """Modelo falso: el embedding es la longitud del texto, normalizado a 1 si se pide"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        self.calls.append((list(sentences), normalize_embeddings))
+        embeddings = np.array([[len(sentence), 0.0] for sentence in sentences], dtype=np.float32)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True) if normalize_embeddings else embeddings
+
+
+@pytest.fixture
+def batcher():
+    batcher = EmbeddingBatcher(RecordingModel(), max_batch_size=2, max_wait_ms=1)
+    yield batcher
+    batcher.close()
+
+
+@pytest.mark.parametrize("sentences", ["matrícula", ["matrícula"], ["matrícula", "horarios", "FIB"]])
+def test_options_apply_whatever_the_input_size(batcher, sentences):
+    embeddings = np.atleast_2d(batcher.encode(sentences, normalize_embeddings=True))
+
+    np.testing.assert_allclose(embeddings[:, 0], 1.0)
+    assert all(normalize for _, normalize in batcher.model.calls)
+
+
+def test_calls_without_options_share_the_queue(batcher):
+    assert batcher.encode("FIB").tolist() == [3.0, 0.0]
+    assert batcher.encode(["FIB", "UPC"]).tolist() == [[3.0, 0.0], [3.0, 0.0]]
+    assert [normalize for _, normalize in batcher.model.calls] == [False, False]
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+LLM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LLM")
+sys.path.insert(0, LLM_DIR)
+
+import embedding_backends  # noqa: E402
+
+ONNX_DIR = os.path.join(LLM_DIR, embedding_backends.DEFAULT_ONNX_DIR)
+
+
+@pytest.fixture(scope="module")
+def reference():
+    pytest.importorskip("sentence_transformers")
+    try:
+        return embedding_backends.SentenceTransformerBackend()
+    except OSError as e:
+        pytest.skip(f"Modelo de referencia no disponible: {e}")
+
+
+@pytest.mark.parametrize("kind, model_file", [("onnx", "model.onnx"), ("onnx-int8", "model.int8.onnx")])
+def test_onnx_backend_matches_sentence_transformers(reference, kind, model_file):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    if not os.path.exists(os.path.join(ONNX_DIR, model_file)):
+        pytest.skip(f"Modelo ONNX no exportado en {ONNX_DIR} (python embedding_backends.py)")
+
+    backend = embedding_backends.load_backend(kind, onnx_dir=ONNX_DIR)
+    parity = embedding_backends.check_parity(backend, reference)
+
+    assert parity["ok"]
+    assert parity["min"] >= embedding_backends.PARITY_THRESHOLD
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        embedding_backends.EmbeddingBackend()
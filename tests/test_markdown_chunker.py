@@ -0,0 +1,46 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LLM"))
+
+from markdown_chunker import chunk_markdown  # noqa: E402
+
+# Piezas con las que se generan documentos parecidos a la salida de html2text
+PIECES = [
+    "# Título\n", "## Página 2\n", "  ", "\n", "\n\n", "- elemento de lista\n", "1. paso\n",
+    "| a | b |\n", "|---|---|\n", "a| b\n", "---|---\n", "palabra ", "matrícula ", "\t",
+    "https://www.fib.upc.edu/" + "x" * 80, "    bloque sangrado\n", "[enlace](https://fib.upc.edu/a/b) ",
+]
+
+
+def assert_invariants(text, chunk_size, overlap):
+    chunks = chunk_markdown(text, chunk_size, overlap)
+    covered = bytearray(len(text))
+    for chunk in chunks:
+        assert chunk.end_char > chunk.start_char
+        assert chunk.text.strip()
+        assert chunk.text == text[chunk.start_char:chunk.end_char]
+        covered[chunk.start_char:chunk.end_char] = b"\1" * (chunk.end_char - chunk.start_char)
+    missing = [i for i, char in enumerate(text) if not char.isspace() and not covered[i]]
+    assert not missing, f"Caracteres sin fragmento en {missing[:5]}"
+    return chunks
+
+
+def test_indented_block_without_spaces_is_not_emptied():
+    chunks = assert_invariants("  " + "x" * 100, 50, 10)
+    assert "".join(chunk.text for chunk in chunks).count("x") >= 100
+
+
+@pytest.mark.parametrize("overlap", [0, 10])
+def test_long_url_is_cut_without_losing_characters(overlap):
+    assert_invariants("Más información en https://www.fib.upc.edu/" + "a" * 200 + " y en secretaría.", 60, overlap)
+
+
+def test_random_documents_keep_invariants():
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 40)))
+        assert_invariants(text, rng.choice([20, 50, 120]), rng.choice([0, 10, 30]))
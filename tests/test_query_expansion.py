@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LLM"))
+
+from query_expansion import QueryExpander  # noqa: E402
+
+
+def write_dictionary(prefix, acronyms=None, terms=None):
+    with open(f"{prefix}_diccionario.json", "w", encoding="utf-8") as f:
+        json.dump({"acronimos": acronyms or {}, "terminos": terms or {}, "relaciones": []}, f)
+
+
+def test_related_terms_come_from_compact_graph(tmp_path):
+    markdown_analyzer = pytest.importorskip("markdown_analyzer")
+    nx = pytest.importorskip("networkx")
+    prefix = str(tmp_path / "resultados")
+    write_dictionary(
+        prefix,
+        acronyms={"TFG": {"definicion": "Treball de Fi de Grau", "conexiones": ["matrícula"]}},
+        terms={"matrícula": {"conexiones": ["TFG"]}, "tribunal": {"conexiones": ["TFG"]},
+               "director": {"conexiones": ["TFG"]}}
+    )
+    graph = nx.Graph()
+    graph.add_node("TFG", tipo="acronimo")
+    graph.add_edge("TFG", "matrícula", weight=1)
+    graph.add_edge("TFG", "tribunal", weight=5)
+    graph.add_edge("TFG", "director", weight=3)
+    markdown_analyzer.exportar_grafo_compacto(graph, prefix)
+
+    expander = QueryExpander.load(prefix, max_related=2)
+
+    # Ordenados por peso, no por número de conexiones en el diccionario
+    assert expander.related["TFG"] == ["tribunal", "director"]
+    assert expander.expand("Entrega del TFG").related == ["tribunal", "director"]
+
+
+def test_related_terms_fall_back_to_dictionary_connections(tmp_path):
+    prefix = str(tmp_path / "resultados")
+    write_dictionary(prefix, acronyms={"TFG": {"definicion": "Treball de Fi de Grau",
+                                               "conexiones": ["tribunal", "matrícula", "tribunal"]}})
+
+    expander = QueryExpander.load(prefix)
+
+    assert expander.related["TFG"] == ["tribunal", "matrícula"]
+
+
+def test_load_without_dictionary_returns_none(tmp_path):
+    assert QueryExpander.load(str(tmp_path / "resultados")) is None
+
+
+def test_acronym_without_definition_adds_related_terms():
+    expander = QueryExpander({}, {}, {"ETSETB": ["telecomunicació", "Campus Nord"]}, known_acronyms={"ETSETB"})
+
+    expanded = expander.expand("ETSETB horarios")
+
+    assert expanded.definitions == {}
+    assert expanded.related == ["telecomunicació", "Campus Nord"]
+    assert expanded.text == "ETSETB horarios (telecomunicació; Campus Nord)"
+
+
+def test_dictionary_acronyms_without_definition_are_known(tmp_path):
+    prefix = str(tmp_path / "resultados")
+    write_dictionary(prefix, acronyms={"ETSETB": {"definicion": None, "conexiones": ["telecomunicació"]}})
+
+    assert QueryExpander.load(prefix).expand("ETSETB horarios").related == ["telecomunicació"]
+
+
+def test_lowercase_only_matches_allowlisted_acronyms():
+    expander = QueryExpander({"TFG": "Treball de Fi de Grau", "PER": "Pla d'Estudis Reglat"}, {}, {})
+
+    assert expander.expand("normativa del tfg").definitions == {"TFG": "Treball de Fi de Grau"}
+    assert not expander.expand("per la matrícula").expanded
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.single_flight import SingleFlight  # noqa: E402
+
+
+class Generation:
+    """Stream controlado por el test: cada `step()` publica un fragmento más"""
+
+    def __init__(self, total=3):
+        self.total = total
+        self.runs = 0
+        self.cancelled = False
+        self.gate = asyncio.Semaphore(0)
+
+    def step(self, n=1):
+        for _ in range(n):
+            self.gate.release()
+
+    async def __call__(self):
+        self.runs += 1
+        try:
+            for i in range(self.total):
+                await self.gate.acquire()
+                yield str(i)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(stream, received=None):
+    received = [] if received is None else received
+    async for chunk in stream:
+        received.append(chunk)
+    return received
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_cancelled_subscriber_does_not_stop_the_others():
+    async def scenario():
+        flights, generation = SingleFlight("test_stream_one_cancelled"), Generation()
+        first = asyncio.ensure_future(collect(flights.stream("k", generation)))
+        second = asyncio.ensure_future(collect(flights.stream("k", generation)))
+        generation.step()
+        await settle()
+        first.cancel()
+        generation.step(2)
+        assert await second == ["0", "1", "2"]
+        assert first.cancelled() and not generation.cancelled
+        assert generation.runs == 1 and flights.shared == 1
+
+    asyncio.run(scenario())
+
+
+def test_flight_is_cancelled_when_every_subscriber_leaves():
+    async def scenario():
+        flights, generation = SingleFlight("test_stream_abandoned"), Generation()
+        subscribers = [asyncio.ensure_future(collect(flights.stream("k", generation))) for _ in range(2)]
+        generation.step()
+        await settle()
+        for subscriber in subscribers:
+            subscriber.cancel()
+        await settle()
+        assert generation.cancelled
+        assert "k" not in flights._flights
+
+    asyncio.run(scenario())
+
+
+def test_late_joiner_replays_published_chunks():
+    async def scenario():
+        flights, generation = SingleFlight("test_stream_late_joiner"), Generation()
+        early = []
+        first = asyncio.ensure_future(collect(flights.stream("k", generation), early))
+        generation.step(2)
+        await settle()
+        assert early == ["0", "1"]
+        late = asyncio.ensure_future(collect(flights.stream("k", generation)))
+        generation.step()
+        assert await late == await first == ["0", "1", "2"]
+        assert generation.runs == 1
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_stream_key_is_released_for_new_callers():
+    async def scenario():
+        flights, generation = SingleFlight("test_stream_released"), Generation()
+        abandoned = asyncio.ensure_future(collect(flights.stream("k", generation)))
+        await settle()
+        abandoned.cancel()
+        await asyncio.sleep(0)
+        # Quien llega justo después, antes de que acabe la cancelación, empieza una generación nueva
+        fresh = asyncio.ensure_future(collect(flights.stream("k", generation)))
+        generation.step(3)
+        assert await fresh == ["0", "1", "2"]
+        assert generation.runs == 2 and flights.started == 2
+
+    asyncio.run(scenario())
+
+
+def test_do_shares_the_result_and_survives_one_cancelled_waiter():
+    async def scenario():
+        flights, release, runs = SingleFlight("test_do_shared"), asyncio.Event(), []
+
+        async def work():
+            runs.append(1)
+            await release.wait()
+            return "resultado"
+
+        first = asyncio.ensure_future(flights.do("k", work))
+        second = asyncio.ensure_future(flights.do("k", work))
+        await settle()
+        first.cancel()
+        await settle()
+        release.set()
+        assert await second == "resultado"
+        assert len(runs) == 1 and flights.shared == 1
+        assert "k" not in flights._calls
+
+    asyncio.run(scenario())
+
+
+def test_do_releases_the_key_as_soon_as_the_last_waiter_leaves():
+    async def scenario():
+        flights, runs = SingleFlight("test_do_released"), []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return len(runs)
+
+        abandoned = asyncio.ensure_future(flights.do("k", work))
+        await settle()
+        abandoned.cancel()
+        await asyncio.sleep(0)
+        # En el mismo ciclo que la cancelación: no debe unirse a la llamada cancelada
+        assert await flights.do("k", work) == 2
+        assert "k" not in flights._calls
+
+    asyncio.run(scenario())